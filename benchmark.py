@@ -0,0 +1,335 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from metrics import percentile
+from mock_ollama_server import add_server_arguments, server_config, start_server
+from scheduling import SCHEDULES
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+DEFAULT_RESULTS_PATH = 'benchmark_results.json'
+PROMPT_LAYOUTS = ('system', 'inline')
+WORDS = 'the quick brown fox jumps over a lazy dog while batman broods in gotham city at night'.split()
+
+
+def make_dataset(path, rows, seed=0):
+    """Write an alpaca-shaped JSONL file with prompts of varied length."""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        for index in range(rows):
+            instruction = ' '.join(rng.choices(WORDS, k=rng.randint(4, 40)))
+            prompt_input = ' '.join(rng.choices(WORDS, k=rng.randint(0, 120)))
+            file.write(json.dumps({'instruction': f'{index} {instruction}', 'input': prompt_input, 'output': ''}) + '\n')
+
+
+def make_system_prompt(words, seed=1):
+    """A persona of `words` words, standing in for a long Batman-style system prompt."""
+    if not words:
+        return 'You are a benchmark.'
+    rng = random.Random(seed)
+    return 'You are Batman. ' + ' '.join(rng.choices(WORDS, k=words))
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_one(args):
+    """Child-process side: run the real pipeline once and print a JSON result line."""
+    from generation_engine import Generator
+    from row_source import RowSource
+    from schemas import get_schema
+
+    latencies = []
+
+    class TimedGenerator(Generator):
+        async def chat(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await super().chat(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+    output_path = os.path.join(args.workdir, f'bench_output_{args.rows}.jsonl')
+    generator = TimedGenerator(RowSource(args.input), get_schema('alpaca'), make_system_prompt(args.system_prompt_words),
+                               args.model, output_path=output_path, concurrency=args.concurrency,
+                               micro_batch=args.micro_batch, schedule=args.schedule,
+                               system_message=args.prompt_layout == 'system')
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    completed = generator.run()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    metrics = generator.metrics.snapshot()
+    requests = metrics['requests'] or 1
+    print(json.dumps({
+        'rows': args.rows,
+        'completed': completed,
+        'concurrency': args.concurrency,
+        'micro_batch': generator.sizer.size if generator.sizer else 1,
+        'prompt_layout': args.prompt_layout,
+        'seconds': elapsed,
+        'rows_per_sec': completed / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+        },
+        'peak_rss_mb': peak_rss_mb(),
+        'cpu_ms_per_row': cpu * 1000 / completed if completed else 0.0,
+        'prompt_eval_ms_per_request': metrics['prompt_eval_duration_seconds'] * 1000 / requests,
+        'prompt_tokens_per_request': metrics['prompt_tokens'] / requests,
+        'metrics': metrics,
+    }))
+
+
+def measure_overhead(rows, batch_size=1000):
+    """Per-row bookkeeping cost, without any model calls, of the old iterrows/to_dict/DataFrame(records)
+    loop versus the columnar RowBatch path the Generator uses."""
+    import pandas as pd
+    from generation_engine import RowBatch
+    from schemas import get_schema
+
+    schema = get_schema('alpaca')
+    rng = random.Random(0)
+    frame = pd.DataFrame({
+        'instruction': [' '.join(rng.choices(WORDS, k=12)) for _ in range(rows)],
+        'input': [' '.join(rng.choices(WORDS, k=30)) for _ in range(rows)],
+        'output': [''] * rows,
+    })
+    batches = [frame.iloc[start:start + batch_size] for start in range(0, rows, batch_size)]
+
+    started = time.perf_counter()
+    for batch in batches:
+        records = []
+        for index, row in batch.iterrows():
+            record = row.to_dict()
+            record['output'] = record['instruction']
+            records.append(record)
+        pd.DataFrame(records)
+    row_wise = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for batch in batches:
+        row_batch = RowBatch(batch, schema)
+        for index, parts in enumerate(row_batch.parts, row_batch.start):
+            row_batch.set_output(index, parts[0])
+        row_batch.finished_frame('output')
+    columnar = time.perf_counter() - started
+
+    return {
+        'rows': rows,
+        'iterrows_us_per_row': row_wise * 1e6 / rows,
+        'columnar_us_per_row': columnar * 1e6 / rows,
+        'speedup': row_wise / columnar if columnar else 0.0,
+    }
+
+
+def measure_connections(url, requests, concurrency):
+    """Client-side cost per request of opening a new connection for every call versus reusing
+    HostPool's keep-alive connections, on one event loop. Both sides share one long-lived client,
+    so only the connection handling differs."""
+    import asyncio
+    import httpx
+    import ollama
+    from generation_engine import run_concurrently
+    from host_pool import HostPool
+
+    messages = [{'role': 'user', 'content': 'ping'}]
+
+    async def measure():
+        pool = HostPool([url], pool_size=concurrency)
+        unpooled = ollama.AsyncClient(host=url, limits=httpx.Limits(max_connections=concurrency,
+                                                                    max_keepalive_connections=0))
+
+        async def unpooled_call():
+            await unpooled.chat(model='mock', messages=messages)
+
+        async def pooled_call():
+            await pool.async_chat(model='mock', messages=messages)
+
+        result = {'requests': requests, 'concurrency': concurrency}
+        try:
+            for name, call in (('unpooled', unpooled_call), ('pooled', pooled_call)):
+                # Warm up (and fill the pool) first.
+                await run_concurrently(((index, ()) for index in range(concurrency)), call, lambda *_: None,
+                                       concurrency)
+                started = time.perf_counter()
+                await run_concurrently(((index, ()) for index in range(requests)), call, lambda *_: None,
+                                       concurrency)
+                elapsed = time.perf_counter() - started
+                result[f'{name}_ms_per_request'] = elapsed * 1000 * concurrency / requests
+                result[f'{name}_requests_per_sec'] = requests / elapsed
+        finally:
+            await unpooled._client.aclose()
+            await pool.aclose()
+        return result
+
+    result = asyncio.run(measure())
+    result['speedup'] = result['pooled_requests_per_sec'] / result['unpooled_requests_per_sec']
+    return result
+
+
+def run_child(server, dataset, rows, args, workdir, prompt_layout=None):
+    """Run one pipeline pass in a fresh process against `server` and return its result."""
+    command = [sys.executable, os.path.abspath(__file__), '--run-one', '--input', dataset,
+               '--rows', str(rows), '--concurrency', str(args.concurrency), '--model', args.model,
+               '--micro-batch', str(args.micro_batch), '--schedule', args.schedule,
+               '--prompt-layout', prompt_layout or args.prompt_layout,
+               '--system-prompt-words', str(args.system_prompt_words), '--workdir', workdir]
+    env = dict(os.environ, OLLAMA_HOST=server.url)
+    completed = subprocess.run(command, env=env, cwd=workdir, stdout=subprocess.PIPE, check=True, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure_prefix_reuse(rows, args, workdir):
+    """Prompt evaluation per request with the server's prompt cache off, with the system prompt
+    pasted into each user message, and with it sent as a system message."""
+    dataset = os.path.join(workdir, f'bench_input_{rows}.jsonl')
+    if not os.path.exists(dataset):
+        make_dataset(dataset, rows)
+    runs = {}
+    for name, layout, prompt_cache in (('no_prompt_cache', 'system', False), ('inline', 'inline', True),
+                                       ('system', 'system', True)):
+        server = start_server(**dict(server_config(args), prompt_cache=prompt_cache))
+        try:
+            runs[name] = run_child(server, dataset, rows, args, workdir, layout)
+        finally:
+            server.shutdown()
+    return runs
+
+
+def compare(results, baseline_path, tolerance):
+    """Return a list of regressions in rows/sec against a previous results file."""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {run['rows']: run for run in json.load(file)['runs']}
+    regressions = []
+    for run in results['runs']:
+        previous = baseline.get(run['rows'])
+        if previous and run['rows_per_sec'] < previous['rows_per_sec'] * (1 - tolerance):
+            regressions.append(f"{run['rows']} rows: {run['rows_per_sec']:.1f} rows/sec "
+                               f"vs baseline {previous['rows_per_sec']:.1f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the generation pipeline against a mock Ollama server.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Dataset sizes in rows.")
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('-m', '--model', default='mock')
+    parser.add_argument('-o', '--output', default=DEFAULT_RESULTS_PATH, help="Where to write the JSON results.")
+    parser.add_argument('--compare', help="Previous results file; exit 1 if throughput regresses.")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed rows/sec drop for --compare.")
+    parser.add_argument('--workdir', help="Directory for synthetic datasets and outputs (default: a temp dir).")
+    parser.add_argument('--overhead', action='store_true',
+                        help="Only microbenchmark per-row pandas overhead (no server) for each size.")
+    parser.add_argument('--micro-batch', type=int, default=0, metavar='N',
+                        help="Let the generator pack up to N rows per request.")
+    parser.add_argument('--schedule', choices=SCHEDULES, default='file', help="Row dispatch order.")
+    parser.add_argument('--prompt-layout', choices=PROMPT_LAYOUTS, default='system',
+                        help="Send the system prompt as a system message or inside every user message.")
+    parser.add_argument('--system-prompt-words', type=int, default=0,
+                        help="Benchmark with a persona system prompt this many words long (default: a short one).")
+    parser.add_argument('--prefix-reuse', action='store_true',
+                        help="Only compare prompt evaluation without the server's prompt cache, with the system "
+                             "prompt inline and as a system message, on the first size.")
+    parser.add_argument('--connections', type=int, metavar='REQUESTS',
+                        help="Only compare a new connection per request with pooled keep-alive connections.")
+    add_server_arguments(parser)
+    parser.add_argument('--run-one', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--input', help=argparse.SUPPRESS)
+    parser.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        run_one(args)
+        return 0
+
+    if args.overhead:
+        runs = [measure_overhead(rows) for rows in args.sizes]
+        for run in runs:
+            print(f"{run['rows']:>9} rows: iterrows {run['iterrows_us_per_row']:7.2f} us/row  "
+                  f"columnar {run['columnar_us_per_row']:7.2f} us/row  ({run['speedup']:.1f}x)")
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'overhead': runs},
+                      file, indent=2)
+        print(f"Results written to '{args.output}'.")
+        return 0
+
+    if args.connections:
+        server = start_server(**server_config(args))
+        try:
+            run = measure_connections(server.url, args.connections, args.concurrency)
+        finally:
+            server.shutdown()
+        print(f"{run['requests']} requests x{run['concurrency']}: "
+              f"new connection {run['unpooled_ms_per_request']:.2f} ms/request "
+              f"({run['unpooled_requests_per_sec']:.0f}/s)  "
+              f"pooled {run['pooled_ms_per_request']:.2f} ms/request ({run['pooled_requests_per_sec']:.0f}/s)  "
+              f"({run['speedup']:.1f}x)")
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'mock_server': server_config(args),
+                       'connections': run}, file, indent=2)
+        print(f"Results written to '{args.output}'.")
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='llm_dataset_bench_')
+    os.makedirs(workdir, exist_ok=True)
+
+    if args.prefix_reuse:
+        runs = measure_prefix_reuse(args.sizes[0], args, workdir)
+        for name, run in runs.items():
+            print(f"{name:>16}: prompt eval {run['prompt_eval_ms_per_request']:7.2f} ms/request  "
+                  f"{run['prompt_tokens_per_request']:7.1f} prompt tokens evaluated/request  "
+                  f"{run['rows_per_sec']:8.1f} rows/sec")
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'mock_server': server_config(args),
+                       'prefix_reuse': runs}, file, indent=2)
+        print(f"Results written to '{args.output}'.")
+        return 0
+
+    server = start_server(**server_config(args))
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'mock_server': server_config(args),
+        'runs': [],
+    }
+    try:
+        for rows in args.sizes:
+            dataset = os.path.join(workdir, f'bench_input_{rows}.jsonl')
+            if not os.path.exists(dataset):
+                make_dataset(dataset, rows)
+            run = run_child(server, dataset, rows, args, workdir)
+            results['runs'].append(run)
+            print(f"{rows:>9} rows: {run['rows_per_sec']:9.1f} rows/sec  "
+                  f"p50 {run['latency_ms']['p50']:7.2f} ms  p95 {run['latency_ms']['p95']:7.2f} ms  "
+                  f"p99 {run['latency_ms']['p99']:7.2f} ms  peak RSS {run['peak_rss_mb'] or 0:7.1f} MB  "
+                  f"CPU {run['cpu_ms_per_row']:.3f} ms/row")
+    finally:
+        server.shutdown()
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to '{args.output}'.")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,445 @@
+import argparse
+import sys
+import threading
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget,
+    QLineEdit, QProgressBar, QAction, QSlider, QLabel, QMessageBox, QComboBox, QSpinBox, QCheckBox
+)
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal, Qt
+from PyQt5.QtGui import QIcon
+
+from generation_engine import Generator, RunControl, DEFAULT_CONCURRENCY
+from host_pool import HostPool, parse_hosts
+from estimator import format_duration
+from row_source import RowSource
+from response_cache import ResponseCache
+from schemas import SCHEMAS, get_schema
+
+class Worker(QThread):
+    """Runs a Generator's event loop on its own thread and turns its progress into Qt signals."""
+
+    update_progress = pyqtSignal(int)
+    finished = pyqtSignal()
+
+    def __init__(self, source, schema, system_prompt, num_rows, model_name, concurrency=DEFAULT_CONCURRENCY,
+                 resume=False, cache=None, client=None, stream=False, schedule='file',
+                 dedup=None, print_prompts=False, print_responses=False):
+        super().__init__()
+        self.generator = Generator(source, schema, system_prompt, model_name, stop=num_rows,
+                                   concurrency=concurrency, resume=resume, cache=cache, client=client,
+                                   stream=stream, schedule=schedule, dedup=dedup, print_prompts=print_prompts,
+                                   print_responses=print_responses)
+        self.control = RunControl()
+
+    def run(self):
+        missing = self.generator.missing_columns()
+        if missing:
+            print(f"Error: Input dataset does not contain the required columns: {', '.join(missing)}.")
+            self.finished.emit()
+            return
+
+        try:
+            self.generator.run(on_progress=self.on_progress, control=self.control)
+        except Exception as e:
+            # Finished rows are already in the output and journal; report and let the window recover.
+            print(f"Error: Generation stopped: {e}")
+        else:
+            print(f"Dataset processing complete. Updated dataset saved as '{self.generator.output_path}'.")
+        self.finished.emit()
+
+    @property
+    def paused(self):
+        return self.control.paused
+
+    def on_progress(self, completed, total):
+        self.update_progress.emit(int(completed / total * 100))
+
+    def stop(self):
+        self.control.stop()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+class AppWindow(QMainWindow):
+    rows_counted = pyqtSignal(int)
+
+    def __init__(self, schema, print_prompts=False, print_responses=False):
+        super().__init__()
+        self.worker = None
+        self.schema = schema
+        self.print_prompts = print_prompts
+        self.print_responses = print_responses
+        self.source = RowSource(schema.ensure_input())
+        self.row_count = None
+        self.cache = ResponseCache()
+        self.client = None
+        self.client_key = None
+        self.eta_text = ''
+        self.dark_mode = False
+        self.init_ui()
+        self.init_menu()
+        self.set_stylesheet()
+        self.count_rows()
+
+    def init_ui(self):
+        self.setGeometry(200, 200, 600, 400)
+        self.setWindowTitle('Data Processor GUI')
+
+        layout = QVBoxLayout()
+
+        models = sorted([
+            "llama3", "uncensored_llama3", "phi3", "wizardlm2", "mistral", "gemma", "mixtral", "llama2",
+            "codegemma", "command-r", "command-r-plus", "llava", "dbrx", "codellama",
+            "qwen", "dolphin-mixtral", "llama2-uncensored", "deepseek-coder",
+            "mistral-openorca", "nomic-embed-text", "dolphin-mistral", "phi",
+            "orca-mini", "nous-hermes2", "zephyr", "llama2-chinese",
+            "wizard-vicuna-uncensored", "starcoder2", "vicuna", "tinyllama",
+            "openhermes", "openchat", "starcoder", "dolphin-llama3", "yi",
+            "tinydolphin", "wizardcoder", "stable-code", "mxbai-embed-large",
+            "neural-chat", "phind-codellama", "wizard-math", "starling-lm",
+            "falcon", "dolphincoder", "orca2", "nous-hermes", "stablelm2",
+            "sqlcoder", "dolphin-phi", "solar", "deepseek-llm", "yarn-llama2",
+            "codeqwen", "bakllava", "samantha-mistral", "all-minilm",
+            "medllama2", "llama3-gradient", "wizardlm-uncensored", "nous-hermes2-mixtral",
+            "xwinlm", "stable-beluga", "codeup", "wizardlm", "yarn-mistral",
+            "everythinglm", "meditron", "llama-pro", "magicoder", "stablelm-zephyr",
+            "nexusraven", "codebooga", "mistrallite", "wizard-vicuna", "llama3-chatqa",
+            "snowflake-arctic-embed", "goliath", "open-orca-platypus2", "llava-llama3",
+            "moondream", "notux", "megadolphin", "duckdb-nsql", "notus", "alfred",
+            "llava-phi3", "falcon2"
+        ])
+
+        self.model_select = QComboBox(self)
+        self.model_select.addItems(models)
+
+        # Set the default value to "llama3"
+        default_model = "llama3"
+        default_index = models.index(default_model)
+        self.model_select.setCurrentIndex(default_index)
+
+        layout.addWidget(self.model_select)
+
+        self.prompt_input = QLineEdit(self)
+        self.prompt_input.setPlaceholderText('Enter your system prompt here...')
+        layout.addWidget(self.prompt_input)
+
+        self.slider_label = QLabel("Number of rows to fill: 0 / counting rows...", self)
+        layout.addWidget(self.slider_label)
+
+        self.slider = QSlider(Qt.Horizontal, self)
+        self.slider.setMinimum(0)
+        self.slider.setMaximum(0)
+        self.slider.setEnabled(False)
+        self.slider.valueChanged.connect(self.update_slider_label)
+        layout.addWidget(self.slider)
+
+        self.hosts_input = QLineEdit(self)
+        self.hosts_input.setPlaceholderText('Ollama hosts, comma-separated (blank for the default host)')
+        layout.addWidget(self.hosts_input)
+
+        self.concurrency_label = QLabel("Concurrent requests (total across hosts):", self)
+        layout.addWidget(self.concurrency_label)
+
+        self.concurrency_input = QSpinBox(self)
+        self.concurrency_input.setRange(1, 512)
+        self.concurrency_input.setValue(DEFAULT_CONCURRENCY)
+        layout.addWidget(self.concurrency_input)
+
+        self.resume_checkbox = QCheckBox("Resume previous run (skip rows already in the journal)", self)
+        layout.addWidget(self.resume_checkbox)
+
+        self.cache_checkbox = QCheckBox("Reuse cached responses for identical prompts", self)
+        self.cache_checkbox.setChecked(True)
+        layout.addWidget(self.cache_checkbox)
+
+        self.stream_checkbox = QCheckBox("Stream tokens (live throughput and time to first token)", self)
+        self.stream_checkbox.setChecked(True)
+        layout.addWidget(self.stream_checkbox)
+
+        self.longest_first_checkbox = QCheckBox("Send longest prompts first (output keeps the original order)",
+                                                self)
+        layout.addWidget(self.longest_first_checkbox)
+
+        self.dedup_checkbox = QCheckBox("Generate repeated prompts once and copy the answer", self)
+        layout.addWidget(self.dedup_checkbox)
+
+        self.generate_button = QPushButton('Generate Dataset')
+        self.generate_button.clicked.connect(self.start_processing)
+        layout.addWidget(self.generate_button)
+
+        self.pause_button = QPushButton('Pause')
+        self.pause_button.clicked.connect(self.pause_processing)
+        self.pause_button.setVisible(False)
+        layout.addWidget(self.pause_button)
+
+        self.stop_button = QPushButton('Stop Now')
+        self.stop_button.clicked.connect(self.stop_processing)
+        layout.addWidget(self.stop_button)
+
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.progress_bar)
+
+        self.throughput_label = QLabel("", self)
+        layout.addWidget(self.throughput_label)
+
+        self.throughput_timer = QTimer(self)
+        self.throughput_timer.setInterval(1000)
+        self.throughput_timer.timeout.connect(self.update_throughput)
+
+        central_widget = QWidget()
+        central_widget.setLayout(layout)
+        self.setCentralWidget(central_widget)
+
+    def init_menu(self):
+        toggle_theme_action = QAction(QIcon(), 'Toggle Theme', self)
+        toggle_theme_action.triggered.connect(self.toggle_theme)
+        self.toolbar = self.addToolBar('Toggle Theme')
+        self.toolbar.addAction(toggle_theme_action)
+
+    def set_stylesheet(self):
+        self.setStyleSheet("""
+            QMainWindow, QWidget {
+                background-color: #f5f5f5;
+                color: #333;
+                font-family: Arial, sans-serif;
+                font-size: 14px;
+            }
+            QPushButton {
+                background-color: #0078d7;
+                color: #fff;
+                border: none;
+                padding: 10px;
+                margin: 5px;
+                border-radius: 5px;
+            }
+            QPushButton:hover {
+                background-color: #005fa3;
+            }
+            QLineEdit, QProgressBar {
+                border: 1px solid #ccc;
+                border-radius: 5px;
+                padding: 5px;
+            }
+            QLabel {
+                margin: 5px;
+            }
+            QSlider::groove:horizontal {
+                border: 1px solid #bbb;
+                background: #f5f5f5;
+                height: 10px;
+                border-radius: 4px;
+            }
+            QSlider::sub-page:horizontal {
+                background: #0078d7;
+                border: 1px solid #777;
+                height: 10px;
+                border-radius: 4px;
+            }
+            QSlider::handle:horizontal {
+                background: #fff;
+                border: 1px solid #0078d7;
+                width: 18px;
+                margin: -2px 0;
+                border-radius: 9px;
+            }
+        """)
+
+    def toggle_theme(self):
+        if self.dark_mode:
+            self.set_stylesheet()
+            self.dark_mode = False
+        else:
+            self.setStyleSheet("""
+                QMainWindow, QWidget {
+                    background-color: #333;
+                    color: #eee;
+                    font-family: Arial, sans-serif;
+                    font-size: 14px;
+                }
+                QPushButton {
+                    background-color: #444;
+                    color: #fff;
+                    border: none;
+                    padding: 10px;
+                    margin: 5px;
+                    border-radius: 5px;
+                }
+                QPushButton:hover {
+                    background-color: #555;
+                }
+                QLineEdit, QProgressBar {
+                    border: 1px solid #555;
+                    border-radius: 5px;
+                    padding: 5px;
+                }
+                QLabel {
+                    margin: 5px;
+                }
+                QSlider::groove:horizontal {
+                    border: 1px solid #bbb;
+                    background: #333;
+                    height: 10px;
+                    border-radius: 4px;
+                }
+                QSlider::sub-page:horizontal {
+                    background: #444;
+                    border: 1px solid #777;
+                    height: 10px;
+                    border-radius: 4px;
+                }
+                QSlider::handle:horizontal {
+                    background: #fff;
+                    border: 1px solid #444;
+                    width: 18px;
+                    margin: -2px 0;
+                    border-radius: 9px;
+                }
+            """)
+            self.dark_mode = True
+
+    def start_processing(self):
+        system_prompt = self.prompt_input.text()
+        num_rows = self.slider.value()
+        model_name = self.model_select.currentText()
+        concurrency = self.concurrency_input.value()
+        resume = self.resume_checkbox.isChecked()
+        cache = self.cache if self.cache_checkbox.isChecked() else None
+        client = self.host_pool(parse_hosts(self.hosts_input.text()), concurrency)
+        if not system_prompt or num_rows == 0:
+            self.show_alert("Please provide a system prompt and select the number of rows to fill.")
+            return
+        self.worker = Worker(self.source, self.schema, system_prompt, num_rows, model_name, concurrency, resume,
+                             cache, client, self.stream_checkbox.isChecked(),
+                             'longest-first' if self.longest_first_checkbox.isChecked() else 'file',
+                             'exact' if self.dedup_checkbox.isChecked() else None,
+                             self.print_prompts, self.print_responses)
+        self.worker.update_progress.connect(self.update_progress_bar)
+        self.worker.finished.connect(self.on_generation_finished)
+        self.worker.start()
+        self.eta_text = ''
+        self.throughput_timer.start()
+        self.generate_button.setVisible(False)
+        self.pause_button.setVisible(True)
+        self.slider.setEnabled(False)
+        self.concurrency_input.setEnabled(False)
+        self.hosts_input.setEnabled(False)
+        self.resume_checkbox.setEnabled(False)
+        self.cache_checkbox.setEnabled(False)
+        self.stream_checkbox.setEnabled(False)
+        self.longest_first_checkbox.setEnabled(False)
+        self.dedup_checkbox.setEnabled(False)
+
+    def host_pool(self, hosts, concurrency):
+        # Reuse the pool (its host statistics and pinned models) across runs unless its settings changed.
+        key = (tuple(hosts), concurrency)
+        if self.client_key != key:
+            pool = HostPool(hosts, pool_size=concurrency)
+            if self.client is not None:
+                # Remember what the old pool pinned so switching models still unloads it.
+                pool.pinned = self.client.pinned
+            self.client = pool
+            self.client_key = key
+        return self.client
+
+    def update_progress_bar(self, value):
+        self.progress_bar.setValue(value)
+        self.progress_bar.setFormat(f"{value}%{self.eta_text}")
+
+    def update_throughput(self):
+        generator = self.worker.generator
+        estimator = generator.estimator
+        if estimator is None:
+            return
+        snapshot = generator.metrics.snapshot()
+        # Sampling here too keeps the rates moving while long rows are still generating.
+        estimator.sample(generator.metrics.generated_tokens())
+        eta = format_duration(estimator.eta_seconds())
+        self.eta_text = f" · {eta} left"
+        self.update_progress_bar(self.progress_bar.value())
+        text = (f"{estimator.tokens_per_sec or 0:.0f} tokens/s  |  "
+                f"{(estimator.rows_per_sec or 0) * 60:.0f} rows/min  |  ETA {eta}")
+        if snapshot['streamed_tokens']:
+            text += f"  |  first token {snapshot['last_first_token_seconds'] * 1000:.0f} ms " \
+                    f"(p95 {snapshot['first_token_p95_seconds'] * 1000:.0f} ms)"
+        self.throughput_label.setText(text)
+
+    def pause_processing(self):
+        if self.worker:
+            if self.worker.paused:
+                self.worker.resume()
+                self.pause_button.setText('Pause')
+            else:
+                self.worker.pause()
+                self.pause_button.setText('Resume')
+
+    def stop_processing(self):
+        if self.worker and self.worker.isRunning():
+            # Rows in flight still finish; the worker's finished signal then restores the window.
+            self.pause_button.setEnabled(False)
+            self.stop_button.setEnabled(False)
+            self.worker.stop()
+
+    def on_generation_finished(self):
+        self.pause_button.setVisible(False)
+        self.pause_button.setEnabled(True)
+        self.pause_button.setText('Pause')
+        self.stop_button.setEnabled(True)
+        self.generate_button.setVisible(True)
+        self.slider.setEnabled(True)
+        self.concurrency_input.setEnabled(True)
+        self.hosts_input.setEnabled(True)
+        self.resume_checkbox.setEnabled(True)
+        self.cache_checkbox.setEnabled(True)
+        self.stream_checkbox.setEnabled(True)
+        self.longest_first_checkbox.setEnabled(True)
+        self.dedup_checkbox.setEnabled(True)
+        self.throughput_timer.stop()
+        self.show_alert("Dataset generation complete. "
+                        f"The updated dataset has been saved as '{self.schema.output_path}'.")
+
+    def count_rows(self):
+        # A large CSV with quoted fields or a JSON array takes a full pass to count; show the window meanwhile.
+        self.rows_counted.connect(self.on_rows_counted)
+        threading.Thread(target=lambda: self.rows_counted.emit(len(self.source)), daemon=True).start()
+
+    def on_rows_counted(self, count):
+        self.row_count = count
+        self.slider.setMaximum(count)
+        self.slider.setEnabled(self.worker is None or not self.worker.isRunning())
+        self.update_slider_label(self.slider.value())
+
+    def update_slider_label(self, value):
+        total = 'counting rows...' if self.row_count is None else self.row_count
+        self.slider_label.setText(f"Number of rows to fill: {value} / {total}")
+
+    def show_alert(self, message):
+        alert = QMessageBox()
+        alert.setText(message)
+        alert.exec_()
+
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            # Closing the window should not wait for long generations; their rows stay unjournaled.
+            self.worker.cancel()
+            self.worker.wait()
+        event.accept()
+
+def main(schema_name='qna', print_prompts=False, print_responses=False):
+    app = QApplication(sys.argv)
+    ex = AppWindow(get_schema(schema_name), print_prompts, print_responses)
+    ex.show()
+    return app.exec_()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fill a dataset with LLM responses from Ollama.")
+    parser.add_argument('--schema', choices=sorted(SCHEMAS), default='qna', help="Dataset layout (default: qna).")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Print every prompt and response.")
+    args = parser.parse_args()
+    sys.exit(main(args.schema, args.verbose, args.verbose))
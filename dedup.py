@@ -0,0 +1,123 @@
+import hashlib
+import re
+import unicodedata
+import zlib
+from collections import Counter
+
+import numpy as np
+
+DEDUP_MODES = ('exact', 'near')
+DEDUP_ACTIONS = ('fan-out', 'drop')
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 64
+SHINGLE_WORDS = 3
+_PRIME = (1 << 31) - 1
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize(text):
+    """Case, Unicode form, whitespace and trailing ?.! differences do not make a prompt new.
+
+    Other punctuation is kept: '2+2' and '2-2', or 'C++' and 'C#', are different questions.
+    """
+    text = ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+    return text.rstrip('?.! ')
+
+
+def shingle_words(text):
+    """The words MinHash shingles are built from: punctuation only separates them."""
+    return _PUNCTUATION.sub(' ', text).split()
+
+
+def choose_bands(num_perm, threshold):
+    """The (bands, rows) split of the signature whose LSH S-curve crosses 50% nearest `threshold`."""
+    splits = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(splits, key=lambda split: abs((1 / split[0]) ** (1 / split[1]) - threshold))
+
+
+class MinHashIndex:
+    """Locality-sensitive index of word-shingle MinHash signatures.
+
+    Candidates sharing any LSH band are confirmed by the estimated Jaccard similarity
+    (the share of equal signature slots), so the threshold is a real similarity cut-off.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, _PRIME, num_perm).astype(np.int64)
+        self.b = rng.randint(0, _PRIME, num_perm).astype(np.int64)
+        self.threshold = threshold
+        self.bands, self.rows = choose_bands(num_perm, threshold)
+        self.buckets = {}
+        self.signatures = {}
+
+    def signature(self, text):
+        words = shingle_words(text)
+        shingles = {' '.join(words[position:position + SHINGLE_WORDS])
+                    for position in range(max(len(words) - SHINGLE_WORDS + 1, 1))}
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+                             dtype=np.int64, count=len(shingles))
+        # Every product stays below 2**63: hashes are 32-bit and the multipliers are below 2**31.
+        return ((np.outer(hashes, self.a) + self.b) % _PRIME).min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def find_or_add(self, index, text):
+        """Return the index of an earlier near-duplicate of `text`, or add it and return None."""
+        signature = self.signature(text)
+        keys = self.band_keys(signature)
+        for key in keys:
+            candidate = self.buckets.get(key)
+            if candidate is not None and np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                return candidate
+        for key in keys:
+            self.buckets.setdefault(key, index)
+        self.signatures[index] = signature
+        return None
+
+
+class Duplicates:
+    """Which rows repeat an earlier row's prompt (`duplicate_of`) and how many copies each
+    representative has (`counts`)."""
+
+    def __init__(self):
+        self.duplicate_of = {}
+        self.counts = Counter()
+        self.rows = 0
+        self.exact = 0
+        self.near = 0
+
+    def __len__(self):
+        return len(self.duplicate_of)
+
+    def summary(self):
+        return (f"{self.exact} exact and {self.near} near duplicates among {self.rows} rows; "
+                f"{len(self)} model calls saved.")
+
+
+def find_duplicates(source, schema, start=0, stop=None, near=False, threshold=DEFAULT_THRESHOLD):
+    """One streaming pass over the prompt columns of rows [start, stop). The first row of every
+    cluster is its representative, so it always comes before its duplicates."""
+    duplicates = Duplicates()
+    seen = {}
+    index_near = MinHashIndex(threshold) if near else None
+    for frame in source.iter_batches(start, stop, columns=schema.prompt_columns):
+        columns = [frame[column].tolist() for column in schema.prompt_columns]
+        for index, parts in enumerate(zip(*columns), frame.index[0]):
+            duplicates.rows += 1
+            text = normalize('\n'.join(map(str, parts)))
+            digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+            representative = seen.get(digest)
+            if representative is not None:
+                duplicates.exact += 1
+            elif index_near is not None:
+                representative = index_near.find_or_add(index, text)
+                if representative is not None:
+                    duplicates.near += 1
+            if representative is None:
+                seen[digest] = index
+                continue
+            duplicates.duplicate_of[index] = representative
+            duplicates.counts[representative] += 1
+    return duplicates
@@ -0,0 +1,124 @@
+import threading
+import time
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text_length):
+    return text_length // CHARS_PER_TOKEN + 1
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--'
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f'{seconds // 3600}h {seconds % 3600 // 60:02d}m'
+    if seconds >= 60:
+        return f'{seconds // 60}m {seconds % 60:02d}s'
+    return f'{seconds}s'
+
+
+class ProgressEstimator:
+    """Predicts the remaining wall time of a run from the prompts it still has to send.
+
+    Per-row request time is fitted as `a + b * prompt_tokens` by exponentially weighted least
+    squares over recently finished rows. The rows left are costed with that fit, using their
+    real prompt lengths once read and the mean length so far for rows not read yet. The total
+    is divided by the measured parallelism: request-seconds completed per wall second, which
+    accounts for concurrency and extra hosts. Rows/sec and tokens/sec are exponentially
+    weighted over samples at least `sample_seconds` apart, so skipped, resumed or out-of-order
+    rows do not distort them.
+    """
+
+    def __init__(self, rows, decay=0.98, alpha=0.3, sample_seconds=1.0):
+        self.decay = decay
+        self.alpha = alpha
+        self.sample_seconds = sample_seconds
+        self.lock = threading.Lock()
+        self.rows_left = rows
+        self.rows_unread = rows
+        self.rows_read = 0
+        self.tokens_read = 0
+        self.queued_tokens = 0
+        # Decayed sums for the fit: weight, x, x^2, y, x*y.
+        self.weight = self.sum_x = self.sum_xx = self.sum_y = self.sum_xy = 0.0
+        self.busy_seconds = 0.0
+        self.rows_since_sample = 0
+        self.last_tokens = 0
+        self.last_sample = time.monotonic()
+        self.parallelism = None
+        self.rows_per_sec = None
+        self.tokens_per_sec = None
+
+    def queued(self, tokens):
+        with self.lock:
+            self.rows_unread -= 1
+            self.rows_read += 1
+            self.tokens_read += tokens
+            self.queued_tokens += tokens
+
+    def observe(self, tokens, seconds):
+        """A request covering a row with `tokens` prompt tokens took `seconds`."""
+        with self.lock:
+            self.weight = self.weight * self.decay + 1
+            self.sum_x = self.sum_x * self.decay + tokens
+            self.sum_xx = self.sum_xx * self.decay + tokens * tokens
+            self.sum_y = self.sum_y * self.decay + seconds
+            self.sum_xy = self.sum_xy * self.decay + tokens * seconds
+            self.busy_seconds += seconds
+
+    def finished(self, tokens):
+        with self.lock:
+            self.rows_left -= 1
+            self.queued_tokens -= tokens
+            self.rows_since_sample += 1
+
+    def sample(self, generated_tokens):
+        """Fold the work done since the last sample into the rates; cheap to call often."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.last_sample
+            if elapsed < self.sample_seconds:
+                return False
+            tokens = generated_tokens - self.last_tokens
+            for name, value in (('rows_per_sec', self.rows_since_sample / elapsed),
+                                ('tokens_per_sec', tokens / elapsed),
+                                ('parallelism', self.busy_seconds / elapsed)):
+                previous = getattr(self, name)
+                setattr(self, name, value if previous is None else previous + self.alpha * (value - previous))
+            self.last_sample = now
+            self.last_tokens = generated_tokens
+            self.rows_since_sample = 0
+            self.busy_seconds = 0.0
+            return True
+
+    def fit(self):
+        if not self.weight:
+            return 0.0, 0.0
+        denominator = self.weight * self.sum_xx - self.sum_x ** 2
+        if denominator <= 1e-9 * self.weight * self.sum_xx:
+            return self.sum_y / self.weight, 0.0
+        slope = (self.weight * self.sum_xy - self.sum_x * self.sum_y) / denominator
+        intercept = (self.sum_y - slope * self.sum_x) / self.weight
+        if slope < 0:
+            return self.sum_y / self.weight, 0.0
+        if intercept < 0:
+            return 0.0, self.sum_xy / self.sum_xx
+        return intercept, slope
+
+    def eta_seconds(self):
+        with self.lock:
+            if self.rows_left <= 0:
+                return 0.0
+            if not self.parallelism or not self.weight:
+                return None
+            intercept, slope = self.fit()
+            mean_tokens = self.tokens_read / self.rows_read if self.rows_read else 0.0
+            remaining_tokens = self.queued_tokens + self.rows_unread * mean_tokens
+            return (intercept * self.rows_left + slope * remaining_tokens) / self.parallelism
+
+    def summary(self):
+        eta = self.eta_seconds()
+        return (f"ETA {format_duration(eta)}, {self.rows_per_sec or 0:.1f} rows/s, "
+                f"{self.tokens_per_sec or 0:.0f} tok/s")
@@ -0,0 +1,207 @@
+import asyncio
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dedup import DEFAULT_THRESHOLD, find_duplicates
+from generation_engine import DEFAULT_CONCURRENCY, Generator
+from host_pool import HostPool, default_hosts
+from metrics import Metrics, MetricsGroup
+
+DEFAULT_READ_AHEAD = 8
+POLL_SECONDS = 0.1
+
+
+def parse_models(specs, default_concurrency=DEFAULT_CONCURRENCY):
+    """Turn ['llama3=6', 'mistral'] into [('llama3', 6), ('mistral', default_concurrency)]."""
+    models = []
+    for spec in specs:
+        model, _, concurrency = spec.partition('=')
+        if not model:
+            raise ValueError(f"Invalid model '{spec}'.")
+        try:
+            models.append((model, int(concurrency) if concurrency else default_concurrency))
+        except ValueError:
+            raise ValueError(f"Invalid concurrency in '{spec}'; expected MODEL=N.") from None
+    names = [model for model, _ in models]
+    if len(set(names)) != len(names):
+        raise ValueError("Each model can only be listed once.")
+    return models
+
+
+def model_output_path(output_path, model):
+    """'filled.csv' and 'llama3:8b' give 'filled.llama3-8b.csv'."""
+    root, extension = os.path.splitext(output_path)
+    return f"{root}.{re.sub(r'[^A-Za-z0-9_.-]+', '-', model)}{extension}"
+
+
+class SharedReader:
+    """Reads rows [start, stop) of `source` once on a background thread and hands every batch to
+    each branch. A branch may run at most `read_ahead` batches ahead of the slowest one; a branch
+    whose consumer has stopped is skipped, so it never holds the others up."""
+
+    def __init__(self, source, start, stop, branches, columns=None, read_ahead=DEFAULT_READ_AHEAD):
+        self.source = source
+        self.start = start
+        self.stop = stop
+        self.columns = columns
+        self.branches = [SourceBranch(self, read_ahead) for _ in range(branches)]
+        self.thread = threading.Thread(target=self._read, daemon=True)
+
+    def begin(self):
+        self.thread.start()
+
+    def _read(self):
+        try:
+            for frame in self.source.iter_batches(self.start, self.stop, columns=self.columns):
+                if all(branch.closed for branch in self.branches):
+                    return
+                for branch in self.branches:
+                    branch.put(frame)
+            item = None
+        except Exception as e:
+            item = e
+        for branch in self.branches:
+            branch.put(item)
+
+
+class SourceBranch:
+    """One consumer's view of a SharedReader, standing in for the source it reads.
+
+    Anything but the batches themselves (length, columns, a working store's column store)
+    comes from the underlying source.
+    """
+
+    def __init__(self, reader, read_ahead):
+        self.reader = reader
+        self.queue = queue.Queue(read_ahead)
+        self.closed = False
+
+    def __len__(self):
+        return len(self.reader.source)
+
+    def __getattr__(self, name):
+        return getattr(self.reader.source, name)
+
+    def put(self, item):
+        while not self.closed:
+            try:
+                self.queue.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    async def aiter_batches(self, start=0, stop=None, batch_size=None, columns=None):
+        """The shared batches; they always cover the reader's [start, stop).
+
+        While a slower branch holds the reader back, the wait happens on a worker thread so
+        the consumer's event loop keeps reading replies, timing requests out and stopping.
+        The wait is cut into POLL_SECONDS steps so a cancelled run never leaves it blocked.
+        """
+        try:
+            while True:
+                try:
+                    item = await asyncio.to_thread(self.queue.get, timeout=POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item if columns is None else item[list(columns)]
+        finally:
+            self.closed = True
+
+
+class FanOut:
+    """Fills the same rows with several models in one pass over the input.
+
+    `models` is a list of (model name, concurrency). Each model has its own Generator, and
+    with it its own concurrency budget, output file, journal, cache entries and metrics, but
+    the input is read and deduplicated once. All models work through the same batches at
+    the same time, so their requests interleave on the hosts. The remaining keyword
+    arguments go to every Generator.
+    """
+
+    def __init__(self, source, schema, system_prompt, models, output_path=None, start=0, stop=None,
+                 client=None, dedup=None, dedup_threshold=DEFAULT_THRESHOLD, read_ahead=DEFAULT_READ_AHEAD,
+                 **options):
+        output_path = output_path or schema.output_path
+        self.source = source
+        self.schema = schema
+        self.start = start
+        self.stop = len(source) if stop is None else min(stop, len(source))
+        self.dedup = dedup
+        self.dedup_threshold = dedup_threshold
+        total_concurrency = sum(concurrency for _, concurrency in models)
+        self.client = client or HostPool(default_hosts(), pool_size=total_concurrency)
+        # Prompt columns only when a working store maps the rest.
+        columns = schema.prompt_columns if hasattr(source, 'column_store') else None
+        self.reader = SharedReader(source, self.start, self.stop, len(models), columns, read_ahead)
+        names = [model for model, _ in models]
+        self.generators = {}
+        for position, ((model, concurrency), branch) in enumerate(zip(models, self.reader.branches)):
+            generator = Generator(branch, schema, system_prompt, model,
+                                  output_path=model_output_path(output_path, model), start=self.start,
+                                  stop=self.stop, concurrency=concurrency, client=self.client, metrics=Metrics(),
+                                  dedup=dedup, dedup_threshold=dedup_threshold,
+                                  pinned_with=[name for name in names if name != model], **options)
+            generator.label = f'[{model}] '
+            generator.progress_position = position
+            self.generators[model] = generator
+        self.metrics = MetricsGroup({model: generator.metrics for model, generator in self.generators.items()})
+        self.lock = threading.Lock()
+        self.completed = {}
+
+    @property
+    def total(self):
+        return sum(generator.total for generator in self.generators.values())
+
+    def missing_columns(self):
+        return self.schema.missing_columns(self.source.columns)
+
+    def run(self, checkpoint=None, on_progress=None):
+        """Run every model to completion; returns {model: rows completed}."""
+        missing = self.missing_columns()
+        if missing:
+            raise ValueError(f"Input dataset does not contain the required columns: {', '.join(missing)}")
+        if self.dedup is not None:
+            duplicates = find_duplicates(self.source, self.schema, self.start, self.stop, near=self.dedup == 'near',
+                                         threshold=self.dedup_threshold)
+            print(f"Dedup: {duplicates.summary()}")
+            for generator in self.generators.values():
+                generator.duplicates = duplicates
+        self.completed = dict.fromkeys(self.generators, 0)
+
+        def progress(model):
+            def report(completed, total):
+                with self.lock:
+                    self.completed[model] = completed
+                    done = sum(self.completed.values())
+                if on_progress is not None:
+                    on_progress(done, self.total)
+            return report
+
+        def run_model(model, generator):
+            try:
+                return generator.run(checkpoint, progress(model))
+            finally:
+                # A model that failed before reading anything must not hold the reader up.
+                generator.source.closed = True
+
+        self.reader.begin()
+        with ThreadPoolExecutor(max_workers=len(self.generators)) as executor:
+            futures = {model: executor.submit(run_model, model, generator)
+                       for model, generator in self.generators.items()}
+            try:
+                return {model: future.result() for model, future in futures.items()}
+            except BaseException:
+                # Ctrl-C or a failed model: let the others drain their in-flight rows and save.
+                self.stop_all()
+                raise
+
+    def stop_all(self):
+        for generator in self.generators.values():
+            generator.control.stop()
@@ -0,0 +1,172 @@
+import argparse
+import sys
+
+from fan_out import FanOut, parse_models
+from generation_engine import Generator, DEFAULT_CONCURRENCY
+from host_pool import DEFAULT_TIMEOUT, HostPool, default_hosts
+from metrics import Metrics, MetricsDumper, serve_metrics
+from rate_limit import Budget, RateLimiter
+from resilience import DEFAULT_ATTEMPTS, RetryPolicy
+from dedup import DEDUP_ACTIONS, DEDUP_MODES, DEFAULT_THRESHOLD
+from scheduling import DEFAULT_SCHEDULE_WINDOW, SCHEDULES
+from response_cache import ResponseCache, DEFAULT_CACHE_PATH
+from row_source import RowSource
+from schemas import SCHEMAS, custom_schema, get_schema
+from working_store import ARROW_EXTENSIONS, open_working_store
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fill a dataset with LLM responses from Ollama without starting the GUI.")
+    parser.add_argument('input', nargs='?',
+                        help="Input dataset (.csv, .json, .jsonl, .parquet or .arrow; default: the schema's input file).")
+    parser.add_argument('--schema', choices=sorted(SCHEMAS), default='qna',
+                        help="Dataset layout: prompt/output columns, default input and output files (default: qna).")
+    parser.add_argument('-m', '--model', default='llama3', help="Ollama model name (default: llama3).")
+    parser.add_argument('--models', nargs='+', metavar='MODEL[=N]',
+                        help="Fill the rows with each of these models in one pass over the input, each with its "
+                             "own concurrency N and output file (<output>.<model>.<ext>). Overrides --model.")
+    prompt = parser.add_mutually_exclusive_group(required=True)
+    prompt.add_argument('-s', '--system-prompt', help="System prompt placed before every row.")
+    prompt.add_argument('--system-prompt-file', help="Read the system prompt from this file.")
+    parser.add_argument('--prompt-columns', nargs='+', help="Override the schema's columns sent to the model, in order.")
+    parser.add_argument('--output-column', help="Override the schema's column to fill.")
+    parser.add_argument('--prompt-template',
+                        help="Override how the prompt is built, e.g. '{system_prompt}\\n\\n{instruction}\\n{input}'.")
+    parser.add_argument('--inline-system-prompt', action='store_true',
+                        help="Render the system prompt into every user message instead of sending it as a system message.")
+    parser.add_argument('--num-ctx', type=int,
+                        help="Context window to pin on every request (default: the model's own setting).")
+    parser.add_argument('--start', type=int, default=0, help="First row to fill (default: 0).")
+    parser.add_argument('--stop', type=int, default=None, help="Row to stop before (default: end of input).")
+    parser.add_argument('--hosts', nargs='+', default=None,
+                        help="Ollama servers to spread rows across (default: OLLAMA_HOST or localhost).")
+    parser.add_argument('-c', '--concurrency', type=int, default=None,
+                        help=f"Total requests kept in flight (default: {DEFAULT_CONCURRENCY} per host).")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Seconds before a single request is abandoned and retried (default: {DEFAULT_TIMEOUT:.0f}).")
+    parser.add_argument('--retries', type=int, default=DEFAULT_ATTEMPTS - 1,
+                        help=f"Retries per row before it goes to the dead-letter file (default: {DEFAULT_ATTEMPTS - 1}).")
+    parser.add_argument('--requests-per-sec', type=float,
+                        help="Send at most this many requests per second (default: no limit).")
+    parser.add_argument('--tokens-per-min', type=float,
+                        help="Send at most this many tokens (prompt plus reply) per minute (default: no limit).")
+    parser.add_argument('--max-tokens', type=int,
+                        help="Stop cleanly once the run has used this many tokens; resume to continue.")
+    parser.add_argument('--max-seconds', type=float,
+                        help="Stop cleanly after this many seconds of wall time; resume to continue.")
+    parser.add_argument('--micro-batch', type=int, default=0, metavar='N',
+                        help="Pack up to N rows into one request, tuned from tokens/sec (default: off).")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream replies token by token and report measured time to first token.")
+    parser.add_argument('--schedule', choices=SCHEDULES, default='file',
+                        help="Send rows in file order or longest prompt first (output order is kept; default: file).")
+    parser.add_argument('--schedule-window', type=int, default=DEFAULT_SCHEDULE_WINDOW,
+                        help=f"Rows reordered together by --schedule longest-first (default: {DEFAULT_SCHEDULE_WINDOW}).")
+    parser.add_argument('--dedup', choices=DEDUP_MODES,
+                        help="Generate each repeated prompt once: 'exact' after normalising case, punctuation and "
+                             "whitespace, 'near' also catches near-duplicates via MinHash/LSH (default: off).")
+    parser.add_argument('--dedup-action', choices=DEDUP_ACTIONS, default='fan-out',
+                        help="Copy the answer to the duplicate rows or drop them from the output (default: fan-out).")
+    parser.add_argument('--dedup-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Jaccard similarity for --dedup near (default: {DEFAULT_THRESHOLD}).")
+    parser.add_argument('--working-store', action='store_true',
+                        help="Memory-map the input from an Arrow IPC copy (made once, next to it) and collect "
+                             "only the answers until the end. Always on for .arrow/.feather input.")
+    parser.add_argument('-f', '--format', choices=['csv', 'jsonl', 'parquet'],
+                        help="Write filled_qna_dataset.<format> instead of the schema's output file.")
+    parser.add_argument('-o', '--output', help="Output path (overrides --format).")
+    parser.add_argument('--resume', action='store_true', help="Skip rows already in the output's journal.")
+    parser.add_argument('--no-cache', action='store_true', help="Do not read or write the response cache.")
+    parser.add_argument('--cache-path', default=DEFAULT_CACHE_PATH, help="Response cache location.")
+    parser.add_argument('--metrics-port', type=int,
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics while running.")
+    parser.add_argument('--metrics-json', help="Periodically write a JSON metrics snapshot to this file.")
+    parser.add_argument('--metrics-interval', type=float, default=10.0,
+                        help="Seconds between --metrics-json snapshots (default: 10).")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Print every prompt and response.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.system_prompt_file:
+        with open(args.system_prompt_file, 'r', encoding='utf-8') as file:
+            system_prompt = file.read().strip()
+    else:
+        system_prompt = args.system_prompt
+    schema = get_schema(args.schema)
+    if args.prompt_columns or args.output_column or args.prompt_template:
+        schema = custom_schema(args.prompt_columns or schema.prompt_columns,
+                               args.output_column or schema.output_column,
+                               schema.input_path, schema.output_path,
+                               args.prompt_template or schema.prompt_template)
+    input_path = args.input or schema.ensure_input()
+    if args.output:
+        output_path = args.output
+    elif args.format:
+        output_path = f'filled_qna_dataset.{args.format}'
+    else:
+        output_path = schema.output_path
+    host_list = args.hosts or default_hosts()
+    concurrency = args.concurrency or DEFAULT_CONCURRENCY * len(host_list)
+    try:
+        models = parse_models(args.models, concurrency) if args.models else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    cache = None if args.no_cache else ResponseCache(args.cache_path)
+    pool_size = sum(concurrency for _, concurrency in models) if models else concurrency
+    hosts = HostPool(host_list, pool_size=pool_size, timeout=args.timeout)
+
+    if args.working_store or input_path.lower().endswith(ARROW_EXTENSIONS):
+        source = open_working_store(input_path)
+    else:
+        source = RowSource(input_path)
+
+    # One limiter and budget for the whole run, shared by every model of a fan-out.
+    limiter = RateLimiter(args.requests_per_sec, args.tokens_per_min)
+    budget = Budget(args.max_tokens, args.max_seconds) if args.max_tokens or args.max_seconds else None
+    options = dict(start=args.start, stop=args.stop, resume=args.resume, cache=cache, client=hosts,
+                   retry=RetryPolicy(attempts=args.retries + 1), micro_batch=args.micro_batch,
+                   stream=args.stream, schedule=args.schedule, schedule_window=args.schedule_window,
+                   dedup=args.dedup, dedup_action=args.dedup_action, dedup_threshold=args.dedup_threshold,
+                   system_message=not args.inline_system_prompt, num_ctx=args.num_ctx,
+                   limiter=limiter, budget=budget, print_prompts=args.verbose, print_responses=args.verbose)
+    if models:
+        generator = FanOut(source, schema, system_prompt, models, output_path=output_path, **options)
+        metrics = generator.metrics
+        output_path = ', '.join(model.output_path for model in generator.generators.values())
+    else:
+        metrics = Metrics()
+        generator = Generator(source, schema, system_prompt, args.model, output_path=output_path,
+                              concurrency=concurrency, metrics=metrics, **options)
+    missing = generator.missing_columns()
+    if missing:
+        print(f"Error: Input dataset does not contain the required columns: {', '.join(missing)}.")
+        return 1
+
+    metrics_server = serve_metrics(metrics, args.metrics_port) if args.metrics_port else None
+    dumper = MetricsDumper(metrics, args.metrics_json, args.metrics_interval).start() if args.metrics_json else None
+    try:
+        generator.run()
+    except KeyboardInterrupt:
+        print(f"Interrupted. Finished rows are saved in '{output_path}' and its journal; rerun with --resume.")
+        return 130
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if dumper is not None:
+            dumper.stop()
+        if cache is not None:
+            cache.close()
+    if budget is not None and budget.exhausted():
+        print(f"Stopped early. Finished rows are saved in '{output_path}' and its journal; "
+              f"rerun with --resume to continue.")
+        return 0
+    print(f"Dataset processing complete. Updated dataset saved as '{output_path}'.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
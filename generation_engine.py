@@ -0,0 +1,700 @@
+import asyncio
+import os
+import time
+
+import httpx
+from tqdm import tqdm
+
+from dedup import DEDUP_ACTIONS, DEDUP_MODES, DEFAULT_THRESHOLD, find_duplicates
+from estimator import ProgressEstimator, estimate_tokens
+from host_pool import DEFAULT_TIMEOUT, IDLE_KEEP_ALIVE, RUN_KEEP_ALIVE, HostPool, default_hosts, \
+    is_host_overloaded
+from journal import Journal, journal_path
+from metrics import Metrics
+from micro_batching import BatchSizer, batch_format, build_batch_prompt, parse_batch_reply
+from rate_limit import RateLimiter
+from resilience import POLL_SECONDS, CircuitBreaker, DeadLetters, FailedRow, RetryPolicy, RunStopped, \
+    dead_letter_path, is_retryable, sleep_unless_stopped
+from response_cache import cache_key
+from scheduling import DEFAULT_SCHEDULE_WINDOW, SCHEDULES, longest_first
+from sinks import OrderedWriter, open_sink
+
+DEFAULT_CONCURRENCY = int(os.environ.get('OLLAMA_NUM_PARALLEL', 4))
+# Chat-template tokens around the system message (role header and end-of-turn marker).
+PREFIX_TEMPLATE_TOKENS = 8
+
+
+async def run_concurrently(jobs, fn, on_result, concurrency=DEFAULT_CONCURRENCY, checkpoint=None, tasks=None):
+    """Await fn(*args) for every (index, args) in jobs with up to `concurrency` calls in flight.
+
+    on_result(index, result) runs as each call completes, so results can arrive out of
+    order. `jobs` may be a plain or an async iterator; an async one can wait for its next
+    job without holding up the calls in flight. A job is only pulled from `jobs` once a slot
+    is free, so a lazy iterator is never read further ahead than the calls in flight.
+    `await checkpoint()` runs before every dispatch and may wait (e.g. while paused);
+    returning False stops dispatching. Calls already in flight are still drained, except
+    those cancelled, which give no result. `tasks` is the dict the in-flight tasks are kept
+    in, for a caller that wants to cancel them. Returns the number of jobs dispatched.
+    """
+    concurrency = max(1, int(concurrency))
+    pending = {} if tasks is None else tasks
+    submitted = 0
+
+    async def collect():
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            index = pending.pop(task)
+            if not task.cancelled():
+                on_result(index, task.result())
+
+    if hasattr(jobs, '__aiter__'):
+        jobs = aiter(jobs)
+
+        async def next_job():
+            return await anext(jobs, None)
+    else:
+        jobs = iter(jobs)
+
+        async def next_job():
+            return next(jobs, None)
+
+    try:
+        while True:
+            while len(pending) >= concurrency:
+                await collect()
+            if checkpoint is not None and not await checkpoint():
+                break
+            job = await next_job()
+            if job is None:
+                break
+            index, args = job
+            pending[asyncio.ensure_future(fn(*args))] = index
+            submitted += 1
+        while pending:
+            await collect()
+    finally:
+        # Only reached with calls still pending if something failed or the run itself was cancelled.
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        pending.clear()
+    return submitted
+
+
+class RunControl:
+    """Pauses, resumes, stops or cancels a running Generator from any thread.
+
+    stop() lets the requests in flight finish and saves them, like a checkpoint returning
+    False; cancel() abandons them as well, so their rows are left for a resumed run.
+    """
+
+    def __init__(self):
+        self.running = True
+        self.paused = False
+        self.tasks = {}
+        self.loop = None
+        self.resumed = None
+
+    def bind(self, loop):
+        self.loop = loop
+        self.resumed = asyncio.Event()
+        self._update()
+
+    def _update(self):
+        if self.paused and self.running:
+            self.resumed.clear()
+        else:
+            self.resumed.set()
+
+    def _call_soon(self, fn):
+        if self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(fn)
+        except RuntimeError:
+            # The run has finished and its loop is closed.
+            pass
+
+    def pause(self):
+        self.paused = True
+        self._call_soon(self._update)
+
+    def resume(self):
+        self.paused = False
+        self._call_soon(self._update)
+
+    def stop(self):
+        self.running = False
+        self._call_soon(self._update)
+
+    def cancel(self):
+        self.stop()
+        self._call_soon(self._cancel_tasks)
+
+    def _cancel_tasks(self):
+        for task in self.tasks:
+            task.cancel()
+
+    async def wait(self):
+        """Wait out a pause; returns False once the run is stopped."""
+        await self.resumed.wait()
+        return self.running
+
+
+class RowBatch:
+    """One input batch in flight: prompts as plain tuples and a preallocated output list,
+    written back to the frame in a single column assignment once every row is done."""
+
+    def __init__(self, frame, schema):
+        self.frame = frame
+        self.start = frame.index[0]
+        self.parts = list(zip(*(frame[column].tolist() for column in schema.prompt_columns)))
+        self.outputs = [None] * len(frame)
+        self.remaining = len(frame)
+        self.kept = None
+
+    def set_output(self, index, output):
+        self.outputs[index - self.start] = output
+        self.remaining -= 1
+
+    def drop(self, index):
+        if self.kept is None:
+            self.kept = [True] * len(self.frame)
+        self.kept[index - self.start] = False
+
+    def finished_frame(self, output_column):
+        frame = self.frame.assign(**{output_column: self.outputs})
+        return frame if self.kept is None else frame[self.kept]
+
+    def partial_frame(self, output_column):
+        kept = self.kept or [True] * len(self.outputs)
+        done = [output is not None and keep for output, keep in zip(self.outputs, kept)]
+        return self.frame.assign(**{output_column: self.outputs})[done]
+
+
+class Generator:
+    """Fills the schema's output column of every row in [start, stop) of a RowSource with a model completion.
+
+    This is the whole generation pipeline (journal, cache, concurrent dispatch and ordered
+    streaming output) with no GUI attached, so it can be driven headless or wrapped by a
+    QThread. It runs on asyncio: every row in flight is a task on one event loop rather than
+    a thread. `control` (a RunControl), `checkpoint` and `on_progress` are the only hooks a
+    front end needs.
+
+    Failed requests are retried per `retry`; while `breaker` is open no new rows are sent.
+    Rows that exhaust their retries are written to the dead-letter file and left empty.
+
+    With `micro_batch` > 1, up to that many rows are packed into one request whose reply is
+    a JSON array of answers; the rows per request are tuned from measured tokens/sec.
+
+    With `stream`, replies are read token by token, which feeds live token counts and the
+    measured time to first token into `metrics`.
+
+    With `schedule='longest-first'`, rows are sent longest prompt first within each
+    `schedule_window` rows so long prompts do not straggle at the end; output order is unchanged.
+
+    With `dedup` ('exact' or 'near'), a pre-pass clusters repeated prompts; only the first
+    row of each cluster is generated and `dedup_action` either copies its answer to the
+    others ('fan-out') or leaves them out of the output ('drop').
+
+    The model is preloaded before the first row and pinned with `keep_alive` for the whole
+    run, pauses included; afterwards it falls back to Ollama's idle timeout.
+
+    With `system_message` the system prompt is sent as a `system` role message ahead of the
+    row, so every request starts with the same templated prefix that Ollama's prompt cache
+    can reuse; `num_keep` is set to cover it and `num_ctx`, if given, is pinned. Otherwise
+    the schema renders the system prompt into the user message.
+
+    Requests wait their turn in `limiter` (a RateLimiter; by default one with no fixed rates
+    that only adapts the requests in flight to 429/503 replies). Once `budget` is used up no
+    new rows are sent and the run ends as if stopped, so it can be resumed.
+    """
+
+    def __init__(self, source, schema, system_prompt, model_name, output_path=None,
+                 start=0, stop=None, concurrency=DEFAULT_CONCURRENCY, resume=False, cache=None,
+                 metrics=None, client=None, retry=None, breaker=None, micro_batch=0, keep_alive=RUN_KEEP_ALIVE,
+                 stream=False, schedule='file', schedule_window=DEFAULT_SCHEDULE_WINDOW,
+                 dedup=None, dedup_action='fan-out', dedup_threshold=DEFAULT_THRESHOLD,
+                 system_message=True, num_ctx=None, pinned_with=(), limiter=None, budget=None,
+                 print_prompts=False, print_responses=False):
+        self.source = source
+        self.schema = schema
+        self.output_path = output_path or schema.output_path
+        self.system_prompt = system_prompt
+        self.model_name = model_name
+        self.start = start
+        self.stop = len(source) if stop is None else min(stop, len(source))
+        self.concurrency = concurrency
+        self.resume = resume
+        self.cache = cache
+        self.metrics = metrics or Metrics()
+        # Anything with HostPool's async_chat(), normally a HostPool; by default one pooled
+        # client for OLLAMA_HOST sized to the concurrency so every in-flight row keeps its socket.
+        self.client = client or HostPool(default_hosts(), pool_size=concurrency)
+        # Cap on one whole request, reading a streamed reply included.
+        self.timeout = getattr(self.client, 'timeout', DEFAULT_TIMEOUT)
+        if hasattr(self.client, 'stats'):
+            self.metrics.hosts = self.client
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or RateLimiter()
+        self.budget = budget
+        self.sending = 0
+        self.sizer = BatchSizer(micro_batch) if micro_batch and micro_batch > 1 else None
+        self.keep_alive = keep_alive
+        self.pinned_with = pinned_with
+        self.stream = stream
+        if schedule not in SCHEDULES:
+            raise ValueError(f"Unknown schedule '{schedule}'. Choose from: {', '.join(SCHEDULES)}.")
+        self.schedule = schedule
+        self.schedule_window = schedule_window
+        if dedup is not None and dedup not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode '{dedup}'. Choose from: {', '.join(DEDUP_MODES)}.")
+        if dedup_action not in DEDUP_ACTIONS:
+            raise ValueError(f"Unknown dedup action '{dedup_action}'. Choose from: {', '.join(DEDUP_ACTIONS)}.")
+        self.dedup = dedup
+        self.dedup_action = dedup_action
+        self.dedup_threshold = dedup_threshold
+        self.duplicates = None
+        self.system_message = system_message and bool(system_prompt)
+        self.prefix = [{'role': 'system', 'content': system_prompt}] if self.system_message else []
+        # The same options on every request; changing them between requests makes Ollama reload the model.
+        self.options = {}
+        if self.system_message:
+            self.options['num_keep'] = estimate_tokens(len(system_prompt)) + PREFIX_TEMPLATE_TOKENS
+        if num_ctx:
+            self.options['num_ctx'] = num_ctx
+        self.print_prompts = print_prompts
+        self.print_responses = print_responses
+        self.control = RunControl()
+        self.completed = 0
+        self.on_progress = None
+        self.estimator = None
+        # Set when several generators share a terminal: prefixes their summary lines and stacks
+        # their progress bars.
+        self.label = ''
+        self.progress_position = None
+
+    @property
+    def total(self):
+        return max(self.stop - self.start, 0)
+
+    def missing_columns(self):
+        return self.schema.missing_columns(self.source.columns)
+
+    def run(self, checkpoint=None, on_progress=None, control=None):
+        """Run to completion on a new event loop in the calling thread; returns the rows completed."""
+        return asyncio.run(self.arun(checkpoint, on_progress, control))
+
+    async def arun(self, checkpoint=None, on_progress=None, control=None):
+        missing = self.missing_columns()
+        if missing:
+            raise ValueError(f"Input dataset does not contain the required columns: {', '.join(missing)}")
+
+        self.on_progress = on_progress
+        self.checkpoint = checkpoint or (lambda: True)
+        if control is not None:
+            self.control = control
+        self.control.bind(asyncio.get_running_loop())
+        if self.budget is not None:
+            self.budget.start()
+        self.journal = Journal(journal_path(self.output_path), resume=self.resume)
+        self.dead_letters = DeadLetters(dead_letter_path(self.output_path))
+        # A working store keeps the input columns mapped and only the answers are collected.
+        self.outputs_only = hasattr(self.source, 'column_store')
+        sink = (self.source.column_store(self.output_path, self.schema.output_column) if self.outputs_only
+                else open_sink(self.output_path))
+        self.output = OrderedWriter(sink, start=self.start)
+        if self.dedup is not None and self.duplicates is None:
+            self.duplicates = find_duplicates(self.source, self.schema, self.start, self.stop,
+                                              near=self.dedup == 'near', threshold=self.dedup_threshold)
+            print(f"{self.label}Dedup: {self.duplicates.summary()}")
+        duplicate_of = self.duplicates.duplicate_of if self.duplicates is not None else {}
+        # Duplicates are always re-derived from their representative, even if an older run journaled them.
+        self.restored = {index: response for index, response in self.journal.completed.items()
+                         if self.start <= index < self.stop and index not in duplicate_of}
+        self.in_flight = {}
+        self.open_batches = {}
+        self.waiting = {}
+        self.answers = {}
+        self.completed = len(self.restored)
+        self.estimator = ProgressEstimator(self.total - self.completed - len(duplicate_of))
+        self.progress = tqdm(total=self.total, initial=self.completed, desc=self.label.strip() or None,
+                             position=self.progress_position)
+        warmed_up = False
+        try:
+            warmed_up = self.completed < self.total and await self.warm_up()
+            if self.sizer is None:
+                await run_concurrently(self.iter_jobs(), self.process, self.on_result,
+                                       concurrency=self.concurrency, checkpoint=self.dispatch_checkpoint,
+                                       tasks=self.control.tasks)
+            else:
+                await run_concurrently(self.iter_groups(), self.process_group, self.on_group_result,
+                                       concurrency=self.concurrency, checkpoint=self.dispatch_checkpoint,
+                                       tasks=self.control.tasks)
+        finally:
+            if warmed_up:
+                await self.client.release(self.model_name, keep_alive=IDLE_KEEP_ALIVE,
+                                          options=self.options or None)
+            if hasattr(self.client, 'aclose'):
+                await self.client.aclose()
+            self.progress.close()
+            self.journal.close()
+            self.dead_letters.close()
+            # A stopped run leaves batches half done; keep the rows that did finish.
+            for batch in self.open_batches.values():
+                self.output.add(batch.start, batch.partial_frame(self.schema.output_column), len(batch.frame))
+            self.output.close()
+
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"{self.label}Response cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate).")
+        print(f"{self.label}Metrics: {self.metrics.summary()}")
+        if hasattr(self.client, 'summary'):
+            print(f"{self.label}Hosts: {self.client.summary()}")
+        if self.sizer is not None:
+            print(f"{self.label}Micro-batching: settled on {self.sizer.size} rows per request.")
+        if self.limiter.overloads or self.limiter.requests or self.limiter.tokens:
+            print(f"{self.label}Rate limit: {self.limiter.summary()}")
+        if self.over_budget():
+            print(f"Warning: {self.label}Stopped early: {self.budget.summary()}.")
+        if self.dead_letters.count:
+            print(f"Warning: {self.label}{self.dead_letters.count} rows failed after retries; "
+                  f"see '{self.dead_letters.path}'. Rerun with resume to retry them.")
+        return self.completed
+
+    def should_continue(self):
+        return self.control.running and self.checkpoint() and not self.over_budget()
+
+    def over_budget(self):
+        return self.budget is not None and self.budget.exhausted()
+
+    async def warm_up(self):
+        if not hasattr(self.client, 'preload'):
+            return False
+        started = time.perf_counter()
+        preload = asyncio.ensure_future(self.client.preload(self.model_name, keep_alive=self.keep_alive,
+                                                            keep=self.pinned_with, options=self.options or None))
+        # A load can take minutes; stop, cancel and the budget must not wait for it.
+        while not (await asyncio.wait({preload}, timeout=POLL_SECONDS))[0]:
+            if not self.should_continue():
+                preload.cancel()
+                await asyncio.gather(preload, return_exceptions=True)
+                return False
+        loaded = preload.result()
+        elapsed = time.perf_counter() - started
+        if not any(loaded.values()):
+            # The rows' own requests retry and fail over as usual; only the load timing is lost.
+            self.progress.write(f"Warning: {self.label}could not load {self.model_name} on any host.")
+            return False
+        self.metrics.record_model_load(elapsed)
+        server = max(((response.get('load_duration') or 0) / 1e9 for response in loaded.values() if response),
+                     default=0.0)
+        self.progress.write(f"Loaded {self.model_name} in {elapsed:.1f} s ({server:.1f} s reported by Ollama).")
+        return True
+
+    async def dispatch_checkpoint(self):
+        return (await self.control.wait() and self.should_continue()
+                and await self.breaker.wait_closed(self.should_continue))
+
+    async def iter_frames(self, columns):
+        # A source fed from another thread (a fan-out branch) is awaited so the loop keeps serving requests.
+        if hasattr(self.source, 'aiter_batches'):
+            async for frame in self.source.aiter_batches(self.start, self.stop, columns=columns):
+                yield frame
+        else:
+            for frame in self.source.iter_batches(self.start, self.stop, columns=columns):
+                yield frame
+
+    async def iter_rows(self):
+        duplicate_of = self.duplicates.duplicate_of if self.duplicates is not None else {}
+        columns = self.schema.prompt_columns if self.outputs_only else None
+        async for frame in self.iter_frames(columns):
+            batch = RowBatch(frame, self.schema)
+            self.open_batches[batch.start] = batch
+            for index, parts in enumerate(batch.parts, batch.start):
+                if index in duplicate_of:
+                    self.resolve_duplicate(batch, index, duplicate_of[index])
+                    continue
+                if index in self.restored:
+                    output = self.restored.pop(index)
+                    self.set_output(batch, index, output)
+                    self.share_answer(index, output)
+                    continue
+                self.in_flight[index] = batch
+                tokens = self.prompt_tokens(parts)
+                self.estimator.queued(tokens)
+                yield index, parts, tokens
+
+    async def iter_jobs(self):
+        rows = self.iter_rows()
+        if self.schedule == 'longest-first':
+            rows = longest_first(rows, self.schedule_window, cost=lambda row: row[2])
+        async for index, parts, _ in rows:
+            yield index, (parts,)
+
+    async def iter_groups(self):
+        # Same rows as iter_jobs, packed into groups of the sizer's current size.
+        group = []
+        async for index, (parts,) in self.iter_jobs():
+            group.append((index, parts))
+            if len(group) >= self.sizer.size:
+                yield tuple(index for index, _ in group), ([parts for _, parts in group],)
+                group = []
+        if group:
+            yield tuple(index for index, _ in group), ([parts for _, parts in group],)
+
+    def set_output(self, batch, index, output):
+        batch.set_output(index, output)
+        if batch.remaining == 0:
+            del self.open_batches[batch.start]
+            self.output.add(batch.start, batch.finished_frame(self.schema.output_column), len(batch.frame))
+
+    def resolve_duplicate(self, batch, index, representative):
+        if self.dedup_action == 'drop':
+            batch.drop(index)
+            self.finish_duplicate(batch, index, None)
+        elif representative in self.answers:
+            output, remaining = self.answers[representative]
+            if remaining > 1:
+                self.answers[representative] = (output, remaining - 1)
+            else:
+                del self.answers[representative]
+            self.finish_duplicate(batch, index, output)
+        else:
+            self.waiting.setdefault(representative, []).append((batch, index))
+
+    def share_answer(self, representative, output):
+        """Hand a representative's answer to its duplicates: those already read now, the rest later."""
+        if self.duplicates is None or self.dedup_action == 'drop':
+            return
+        remaining = self.duplicates.counts.get(representative, 0)
+        for batch, index in self.waiting.pop(representative, ()):
+            self.finish_duplicate(batch, index, output)
+            remaining -= 1
+        if remaining > 0:
+            self.answers[representative] = (output, remaining)
+
+    def finish_duplicate(self, batch, index, output):
+        self.metrics.record_deduplicated()
+        self.set_output(batch, index, output)
+        self.advance()
+
+    def advance(self, answered=True):
+        if answered:
+            self.completed += 1
+            self.metrics.record_row()
+        if self.estimator.sample(self.metrics.generated_tokens()):
+            self.progress.set_postfix_str(self.estimator.summary(), refresh=False)
+        self.progress.update(1)
+        if self.on_progress is not None:
+            # Dead-lettered rows are finished too, so the progress still reaches the total.
+            self.on_progress(self.completed + self.dead_letters.count, self.total)
+
+    def render(self, parts):
+        if self.system_message:
+            return self.schema.render_row(parts)
+        return self.schema.render(self.system_prompt, parts)
+
+    def prompt_tokens(self, parts):
+        return estimate_tokens(len(self.system_prompt) + sum(len(str(part)) for part in parts))
+
+    def on_result(self, index, response):
+        batch = self.in_flight.pop(index)
+        if isinstance(response, FailedRow):
+            if response.stopped:
+                return
+            self.estimator.finished(self.prompt_tokens(batch.parts[index - batch.start]))
+            self.dead_letters.append(index, batch.parts[index - batch.start], response.error, response.attempts)
+            self.metrics.record_dead_letter()
+            print(f"Error: row {index} failed after {response.attempts} attempts: {response.error}")
+            self.set_output(batch, index, None)
+            self.share_answer(index, None)
+            self.advance(answered=False)
+            return
+        self.journal.append(index, response)
+        if self.print_prompts:
+            print(*batch.parts[index - batch.start])
+        if self.print_responses:
+            print(response)
+        self.set_output(batch, index, response)
+        self.estimator.finished(self.prompt_tokens(batch.parts[index - batch.start]))
+        self.advance()
+        self.share_answer(index, response)
+
+    def on_group_result(self, indices, outputs):
+        for index, output in zip(indices, outputs):
+            self.on_result(index, output)
+
+    async def process(self, parts):
+        started = time.perf_counter()
+        output = await self.with_retries(self.get_ollama_response, *parts)
+        if not isinstance(output, FailedRow):
+            self.estimator.observe(self.prompt_tokens(parts), time.perf_counter() - started)
+        return output
+
+    async def process_group(self, group):
+        started = time.perf_counter()
+        outputs = await self.answer_group(group)
+        # One request slot served the whole group; share its time out between the rows.
+        share = (time.perf_counter() - started) / len(group)
+        for parts, output in zip(group, outputs):
+            if not isinstance(output, FailedRow):
+                self.estimator.observe(self.prompt_tokens(parts), share)
+        return outputs
+
+    async def answer_group(self, group):
+        prompts = [self.render(parts) for parts in group]
+        outputs = [self.cached_response(prompt) for prompt in prompts]
+        todo = [position for position, output in enumerate(outputs) if output is None]
+        if len(todo) > 1:
+            packed = await self.with_retries(self.get_batched_responses, [group[position] for position in todo],
+                                             [prompts[position] for position in todo])
+            if not isinstance(packed, FailedRow):
+                for position, output in zip(todo, packed):
+                    outputs[position] = output
+                return outputs
+            if packed.stopped or is_retryable(packed.error):
+                return [packed if output is None else output for output in outputs]
+            # The reply could not be split into answers (or the server rejected the packed
+            # request): ask for these rows one by one instead.
+            self.sizer.record_failure()
+        for position in todo:
+            outputs[position] = await self.with_retries(self.generate, prompts[position])
+        return outputs
+
+    async def with_retries(self, fn, *args):
+        for attempt in range(1, self.retry.attempts + 1):
+            if not await self.breaker.acquire(self.should_continue):
+                return FailedRow(None, attempt - 1, stopped=True)
+            try:
+                response = await fn(*args)
+            except RunStopped:
+                return FailedRow(None, attempt - 1, stopped=True)
+            except Exception as error:
+                if not is_retryable(error):
+                    # The server answered, so it is healthy; this row is simply bad.
+                    self.breaker.record_success()
+                    return FailedRow(error, attempt)
+                if is_host_overloaded(error):
+                    # A busy server is the limiter's business; tripping the breaker would idle the run.
+                    # It still has to give back a half-open probe slot, or nothing is ever sent again.
+                    self.breaker.release_probe()
+                else:
+                    self.breaker.record_failure()
+                if attempt == self.retry.attempts:
+                    return FailedRow(error, attempt)
+                self.metrics.record_retry()
+                if not await sleep_unless_stopped(self.retry.delay(attempt), self.should_continue):
+                    return FailedRow(error, attempt, stopped=True)
+                continue
+            self.breaker.record_success()
+            return response
+
+    async def get_ollama_response(self, *parts):
+        prompt = self.render(parts)
+        cached = self.cached_response(prompt)
+        if cached is not None:
+            return cached
+        return await self.generate(prompt)
+
+    async def get_batched_responses(self, group, prompts):
+        # The system prompt goes in once; each row is rendered without it.
+        rows = [self.schema.render_row(parts) for parts in group]
+        system_prompt = '' if self.system_message else self.system_prompt
+        response = await self.chat(build_batch_prompt(system_prompt, rows), rows=len(rows),
+                                   format=batch_format(len(rows)))
+        answers = parse_batch_reply(response['message']['content'], len(rows))
+        for prompt, answer in zip(prompts, answers):
+            self.store_response(prompt, answer)
+        return answers
+
+    async def generate(self, prompt):
+        content = (await self.chat(prompt))['message']['content']
+        self.store_response(prompt, content)
+        return content
+
+    async def chat(self, content, rows=1, **options):
+        messages = [
+            *self.prefix,
+            {
+                'role': 'user',
+                'content': content,
+            },
+        ]
+        estimated = self.limiter.estimate(estimate_tokens(sum(len(message['content']) for message in messages)))
+        queued = time.perf_counter()
+        if not (await self.limiter.wait_for_slot(lambda: self.sending, self.concurrency, self.should_continue)
+                and await self.limiter.acquire(estimated, self.should_continue)):
+            raise RunStopped()
+        self.sending += 1
+        started = time.perf_counter()
+        self.metrics.observe_rate_limit_wait(started - queued)
+
+        async def request():
+            response = await self.client.async_chat(model=self.model_name, messages=messages,
+                                                    options=self.options or None, keep_alive=self.keep_alive,
+                                                    stream=self.stream, **options)
+            if self.stream:
+                response = await self.read_stream(response, started)
+            return response
+
+        try:
+            response = await asyncio.wait_for(request(), self.timeout)
+        except Exception as error:
+            self.metrics.record_error()
+            if is_host_overloaded(error):
+                self.limiter.record_overload(started)
+            if isinstance(error, asyncio.TimeoutError):
+                # Retried like any other timeout; the cancelled request has already freed its host.
+                raise httpx.TimeoutException(f"no complete reply within {self.timeout:g} s") from None
+            raise
+        finally:
+            self.sending -= 1
+        wall = time.perf_counter() - started
+        self.metrics.record_response(response, wall)
+        # Servers that report no counts are charged the estimate.
+        used = (response.get('prompt_eval_count') or 0) + (response.get('eval_count') or 0) or estimated
+        self.limiter.record_response(estimated, used, response.get('eval_count'))
+        if self.budget is not None:
+            self.budget.spend(used)
+        if self.sizer is not None:
+            self.sizer.record(rows, response.get('eval_count') or 0, wall)
+        return response
+
+    async def read_stream(self, chunks, started):
+        pieces = []
+        final = None
+        async for chunk in chunks:
+            piece = chunk['message']['content']
+            if piece:
+                if not pieces:
+                    self.metrics.record_first_token(time.perf_counter() - started)
+                pieces.append(piece)
+                self.metrics.record_streamed_tokens()
+            if chunk.get('done'):
+                final = chunk
+        if final is None:
+            # The connection closed mid-reply; retry the row rather than keep a truncated answer.
+            raise httpx.RemoteProtocolError("stream ended before the final chunk")
+        # The last chunk carries the timings; give it the whole reply like a non-streamed response.
+        final['message']['content'] = ''.join(pieces)
+        return final
+
+    def cached_response(self, prompt):
+        if self.cache is None:
+            return None
+        cached = self.cache.get(self.cache_key(prompt))
+        if cached is not None:
+            self.metrics.record_cache_hit()
+        return cached
+
+    def store_response(self, prompt, content):
+        if self.cache is not None:
+            self.cache.put(self.cache_key(prompt), content)
+
+    def cache_key(self, prompt):
+        if self.system_message:
+            return cache_key(self.model_name, self.system_prompt, prompt)
+        return cache_key(self.model_name, prompt)
@@ -0,0 +1,308 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+import httpx
+import ollama
+
+DEFAULT_COOLDOWN = 30.0
+# Seconds a host that answered 429/503 is passed over while other hosts still take requests.
+OVERLOAD_BACKOFF = 1.0
+DEFAULT_POOL_SIZE = 4
+# Seconds one whole request (a streamed reply included) may take; long generations on a slow box can
+# legitimately take minutes. httpx only applies it per connect/read/write, so Generator.chat enforces the total.
+DEFAULT_TIMEOUT = 300.0
+# keep_alive while a run is going (never unload, even across long pauses) and once it ends (Ollama's default).
+RUN_KEEP_ALIVE = -1
+IDLE_KEEP_ALIVE = '5m'
+# Idle connections are kept this long; Ollama itself never closes an idle keep-alive socket sooner.
+KEEPALIVE_SECONDS = 120.0
+EWMA_ALPHA = 0.2
+# 429 (rate limited) and 503 (Ollama's request queue is full): the host is up but wants fewer requests.
+OVERLOAD_STATUSES = (429, 503)
+# Connections per AsyncClient; larger async pools cost CPU quadratic in their size (see AsyncShards).
+ASYNC_SHARD_SIZE = 4
+
+
+def connection_limits(pool_size):
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                        keepalive_expiry=KEEPALIVE_SECONDS)
+
+
+def make_async_client(host, pool_size=DEFAULT_POOL_SIZE, **kwargs):
+    """An ollama.AsyncClient whose keep-alive connection pool holds exactly `pool_size` sockets."""
+    return ollama.AsyncClient(host=host, limits=connection_limits(pool_size), **kwargs)
+
+
+class AsyncShards:
+    """A host's AsyncClients for one event loop, each holding at most ASYNC_SHARD_SIZE connections.
+
+    httpcore's async pool checks every idle connection each time it hands one out, so a
+    single pool of hundreds of sockets spends more CPU than the requests themselves. Several
+    small pools, the least busy one taking the next request, keep that cost flat.
+    """
+
+    def __init__(self, host, pool_size, timeout):
+        count = max(1, -(-pool_size // ASYNC_SHARD_SIZE))
+        size = -(-pool_size // count)
+        self.clients = [make_async_client(host, size, timeout=timeout) for _ in range(count)]
+        self.in_flight = [0] * count
+
+    def acquire(self):
+        shard = self.in_flight.index(min(self.in_flight))
+        self.in_flight[shard] += 1
+        return shard
+
+    def release(self, shard):
+        self.in_flight[shard] -= 1
+
+    async def aclose(self):
+        for client in self.clients:
+            await client._client.aclose()
+
+
+def default_hosts():
+    return [os.environ.get('OLLAMA_HOST', 'http://127.0.0.1:11434')]
+
+
+def parse_hosts(text):
+    """Split a comma- or whitespace-separated host list, falling back to OLLAMA_HOST."""
+    hosts = [host for host in text.replace(',', ' ').split() if host] if text else []
+    return hosts or default_hosts()
+
+
+def is_host_overloaded(error):
+    """429 (rate limited) or 503 (Ollama's request queue is full): the host is up but wants less."""
+    return isinstance(error, ollama.ResponseError) and error.status_code in OVERLOAD_STATUSES
+
+
+def is_host_failure(error):
+    """Connection failures and 5xx, except overload replies: those slow the run down rather
+    than take the host out of rotation."""
+    if isinstance(error, (ConnectionError, httpx.TransportError)):
+        return True
+    return (isinstance(error, ollama.ResponseError) and error.status_code >= 500
+            and error.status_code not in OVERLOAD_STATUSES)
+
+
+class HostState:
+    def __init__(self, host, pool_size, timeout):
+        self.host = host
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._async_shards = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.overloads = 0
+        self.ewma_seconds = None
+        self.down_until = 0.0
+        self.busy_until = 0.0
+
+    @property
+    def async_shards(self):
+        # One set per event loop: httpx's async connections cannot be shared between loops,
+        # and every run (or every model of a fan-out) drives its own.
+        loop = asyncio.get_running_loop()
+        shards = self._async_shards.get(loop)
+        if shards is None:
+            shards = self._async_shards[loop] = AsyncShards(self.host, self.pool_size, self.timeout)
+        return shards
+
+    def expected_wait(self):
+        # Unmeasured hosts look free so every host gets probed early on.
+        return (self.in_flight + 1) * (self.ewma_seconds or 0.0)
+
+    def stats(self, now):
+        return {
+            'host': self.host,
+            'requests': self.requests,
+            'errors': self.errors,
+            'overloads': self.overloads,
+            'in_flight': self.in_flight,
+            'mean_seconds': self.ewma_seconds or 0.0,
+            'rows_per_sec': 1 / self.ewma_seconds if self.ewma_seconds else 0.0,
+            'up': self.down_until <= now,
+        }
+
+
+class HostPool:
+    """Spreads chat requests over several Ollama hosts through long-lived, pooled clients.
+
+    Each request goes to the host with the lowest expected completion time (in-flight
+    requests times its moving-average latency), so faster boxes take more rows. A host
+    that refuses connections or returns 5xx is skipped for `cooldown` seconds and the
+    request is retried on the next best host. A 429 or 503 only means the host is busy: it
+    is passed over for OVERLOAD_BACKOFF seconds and the request moves on to a host that is
+    not, so one saturated box does not slow the others down. Only when every host has
+    refused it is the overload raised to the caller.
+
+    Each host keeps up to `pool_size` keep-alive connections (set it to the run's
+    concurrency) so rows reuse sockets instead of reconnecting. A request that stalls for
+    `timeout` seconds (connecting, or waiting for the next bytes) fails like a refused
+    connection; capping a whole request at `timeout` is left to the caller.
+    """
+
+    def __init__(self, hosts, cooldown=DEFAULT_COOLDOWN, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        if not hosts:
+            raise ValueError("HostPool needs at least one host.")
+        self.hosts = [HostState(host, pool_size, timeout) for host in hosts]
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.pinned = set()
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def _acquire(self, tried):
+        with self.lock:
+            now = time.monotonic()
+            candidates = [state for state in self.hosts if state not in tried]
+            up = [state for state in candidates if state.down_until <= now]
+            idle = [state for state in up if state.busy_until <= now]
+            # With every host down, try the one that comes back soonest rather than fail outright.
+            pool = idle or up or sorted(candidates, key=lambda state: state.down_until)[:1]
+            if not pool:
+                return None
+            state = min(pool, key=HostState.expected_wait)
+            state.in_flight += 1
+            return state
+
+    def _release(self, state, seconds=None, failed=False, overloaded=False):
+        with self.lock:
+            state.in_flight -= 1
+            if overloaded:
+                # Up but saturated: neither a success for its latency average nor a reason to take it out.
+                state.overloads += 1
+                state.busy_until = time.monotonic() + OVERLOAD_BACKOFF
+                return
+            if failed:
+                state.errors += 1
+                state.down_until = time.monotonic() + self.cooldown
+                return
+            if seconds is None:
+                # Cancelled: the request says nothing about the host.
+                return
+            state.requests += 1
+            state.down_until = 0.0
+            state.busy_until = 0.0
+            if state.ewma_seconds is None:
+                state.ewma_seconds = seconds
+            else:
+                state.ewma_seconds += EWMA_ALPHA * (seconds - state.ewma_seconds)
+
+    async def async_chat(self, **kwargs):
+        """ollama's chat() on the best host's AsyncClient, failing over to the next host while
+        hosts refuse or are overloaded. A streamed reply is returned as an async iterator that keeps the host
+        busy until it has been read."""
+        tried = []
+        last_error = None
+        while True:
+            state = self._acquire(tried)
+            if state is None:
+                raise last_error
+            tried.append(state)
+            shards = state.async_shards
+            shard = shards.acquire()
+            started = time.perf_counter()
+            try:
+                response = await shards.clients[shard].chat(**kwargs)
+                if kwargs.get('stream'):
+                    # Pull the first chunk here so a dead host still fails over to the next one.
+                    first = await anext(response)
+            except asyncio.CancelledError:
+                shards.release(shard)
+                self._release(state)
+                raise
+            except Exception as error:
+                shards.release(shard)
+                if is_host_overloaded(error):
+                    self._release(state, overloaded=True)
+                elif is_host_failure(error):
+                    self._release(state, failed=True)
+                else:
+                    self._release(state, time.perf_counter() - started)
+                    raise
+                last_error = error
+                continue
+            if kwargs.get('stream'):
+                return self._astream(state, shards, shard, started, first, response)
+            shards.release(shard)
+            self._release(state, time.perf_counter() - started)
+            return response
+
+    async def _astream(self, state, shards, shard, started, first, chunks):
+        failed = False
+        cancelled = False
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception as error:
+            failed = is_host_failure(error)
+            raise
+        finally:
+            elapsed = None if failed or cancelled else time.perf_counter() - started
+            shards.release(shard)
+            self._release(state, elapsed, failed=failed)
+            await chunks.aclose()
+
+    async def aclose(self):
+        """Close the async connections opened from the running event loop."""
+        loop = asyncio.get_running_loop()
+        for state in self.hosts:
+            shards = state._async_shards.pop(loop, None)
+            if shards is not None:
+                await shards.aclose()
+
+    async def _on_every_host(self, fn):
+        async def call(state):
+            shards = state.async_shards
+            shard = shards.acquire()
+            try:
+                return state.host, await fn(shards.clients[shard])
+            except Exception as e:
+                print(f"Warning: {state.host}: {e}")
+                return state.host, None
+            finally:
+                shards.release(shard)
+        # Sequential loads would make start-up time grow with the number of hosts.
+        return dict(await asyncio.gather(*(call(state) for state in self.hosts)))
+
+    async def preload(self, model, keep_alive=RUN_KEEP_ALIVE, keep=(), options=None):
+        """Load `model` on every host and keep it resident for `keep_alive`, first unloading any
+        other model this pool pinned except those in `keep`. Pass the run's `options` so the model
+        is loaded with the context size its requests will use. Returns {host: response} (None
+        where the host failed)."""
+        for stale in self.pinned - {model, *keep}:
+            await self.unload(stale)
+        self.pinned.add(model)
+        # An empty prompt makes Ollama load the model without generating anything.
+        return await self._on_every_host(lambda client: client.generate(model=model, prompt='', keep_alive=keep_alive,
+                                                                  options=options))
+
+    async def release(self, model, keep_alive=IDLE_KEEP_ALIVE, options=None):
+        """Let `model` be unloaded after `keep_alive` of inactivity, as if no run had pinned it."""
+        await self._on_every_host(lambda client: client.generate(model=model, prompt='', keep_alive=keep_alive,
+                                                           options=options))
+
+    async def unload(self, model):
+        self.pinned.discard(model)
+        await self._on_every_host(lambda client: client.generate(model=model, prompt='', keep_alive=0))
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            return [state.stats(now) for state in self.hosts]
+
+    def summary(self):
+        return '; '.join(f"{entry['host']}: {entry['requests']} ok, {entry['errors']} failed, "
+                         f"{entry['overloads']} overloaded, "
+                         f"{entry['mean_seconds'] * 1000:.0f} ms avg{'' if entry['up'] else ' (down)'}"
+                         for entry in self.stats())
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+
+# Longest a finished row may sit in the OS page cache before it is fsynced.
+SYNC_SECONDS = 0.1
+
+
+def journal_path(output_path):
+    return f'{output_path}.journal.jsonl'
+
+
+def load_journal(path):
+    """Return {row index: output} for every complete record in the journal at path."""
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash mid-write can leave a torn last line behind.
+                continue
+            completed[record['index']] = record['output']
+    return completed
+
+
+def _truncate_torn_tail(path):
+    with open(path, 'rb+') as file:
+        data = file.read()
+        if data and not data.endswith(b'\n'):
+            file.truncate(data.rfind(b'\n') + 1)
+
+
+class Journal:
+    """Append-only JSONL record of finished rows, so a crashed run can be resumed.
+
+    Each row is written and flushed at once, so it survives the process dying. fsync is
+    group-committed on a background thread every `sync_seconds` while rows are pending, and
+    on close, so a power loss or OS crash loses at most the rows of the last `sync_seconds`
+    and appending never waits for the disk.
+    """
+
+    def __init__(self, path, resume=False, sync_seconds=SYNC_SECONDS):
+        self.path = path
+        self.completed = {}
+        if resume and os.path.exists(path):
+            self.completed = load_journal(path)
+            _truncate_torn_tail(path)
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        self.sync_seconds = sync_seconds
+        self.dirty = threading.Event()
+        self.closed = threading.Event()
+        self.syncer = threading.Thread(target=self._sync_loop, daemon=True)
+        self.syncer.start()
+
+    def append(self, index, output):
+        self.file.write(json.dumps({'index': int(index), 'output': output}) + '\n')
+        self.file.flush()
+        self.dirty.set()
+
+    def _sync_loop(self):
+        while not self.closed.wait(self.sync_seconds):
+            if self.dirty.is_set():
+                self.dirty.clear()
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        self.closed.set()
+        self.syncer.join()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
@@ -0,0 +1,309 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Durations Ollama reports per reply, in nanoseconds.
+DURATION_FIELDS = ('total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration')
+COUNT_FIELDS = ('prompt_eval_count', 'eval_count')
+DEFAULT_WINDOW = 1000
+PREFIX = 'llm_dataset'
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class Metrics:
+    """Thread-safe aggregate of per-request timings from Ollama replies and the client side.
+
+    Server-side fields come straight from the reply; `rate_limit_wait` is how long a request
+    waited for its turn under the rate limiter (a free slot, the configured rates) and
+    `wall_time` is the client-observed request time.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.generation_started = self.started
+        self.model_load_seconds = 0.0
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.dead_letters = 0
+        self.deduplicated = 0
+        self.totals = dict.fromkeys(DURATION_FIELDS + COUNT_FIELDS, 0)
+        self.rate_limit_wait_total = 0.0
+        self.rate_limit_waits = 0
+        self.wall_time_total = 0.0
+        self.recent_wall_times = deque(maxlen=window)
+        self.recent_rate_limit_waits = deque(maxlen=window)
+        self.streamed_tokens = 0
+        self.recent_first_tokens = deque(maxlen=window)
+        # Optional HostPool whose per-host stats are included in snapshots.
+        self.hosts = None
+
+    def observe_rate_limit_wait(self, seconds):
+        with self.lock:
+            self.rate_limit_wait_total += seconds
+            self.rate_limit_waits += 1
+            self.recent_rate_limit_waits.append(seconds)
+
+    def record_response(self, response, wall_time):
+        with self.lock:
+            self.requests += 1
+            self.wall_time_total += wall_time
+            self.recent_wall_times.append(wall_time)
+            for field in DURATION_FIELDS + COUNT_FIELDS:
+                self.totals[field] += response.get(field) or 0
+
+    def record_row(self):
+        """A row got its answer: from the model, a micro-batch, the cache or a duplicate."""
+        with self.lock:
+            self.rows += 1
+
+    def record_first_token(self, seconds):
+        with self.lock:
+            self.recent_first_tokens.append(seconds)
+
+    def record_streamed_tokens(self, count=1):
+        with self.lock:
+            self.streamed_tokens += count
+
+    def generated_tokens(self):
+        """Tokens generated so far, counted as they stream in when streaming."""
+        with self.lock:
+            return self.streamed_tokens or self.totals['eval_count']
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def record_model_load(self, seconds):
+        # Throughput is measured from here on, so a cold start does not drag down rows/sec.
+        with self.lock:
+            self.model_load_seconds += seconds
+            self.generation_started = time.monotonic()
+
+    def record_deduplicated(self):
+        with self.lock:
+            self.deduplicated += 1
+
+    def record_cache_hit(self):
+        with self.lock:
+            self.cache_hits += 1
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def record_dead_letter(self):
+        with self.lock:
+            self.dead_letters += 1
+
+    def snapshot(self):
+        with self.lock:
+            requests = self.requests
+            totals = dict(self.totals)
+            seconds = {field: totals[field] / 1e9 for field in DURATION_FIELDS}
+            wall_times = list(self.recent_wall_times)
+            rate_limit_waits = list(self.recent_rate_limit_waits)
+            first_tokens = list(self.recent_first_tokens)
+            snapshot = {
+                'uptime_seconds': time.monotonic() - self.started,
+                'generation_seconds': time.monotonic() - self.generation_started,
+                'model_load_seconds': self.model_load_seconds,
+                'requests': requests,
+                'rows': self.rows,
+                'errors': self.errors,
+                'cache_hits': self.cache_hits,
+                'deduplicated': self.deduplicated,
+                'retries': self.retries,
+                'dead_letters': self.dead_letters,
+                'streamed_tokens': self.streamed_tokens,
+                'prompt_tokens': totals['prompt_eval_count'],
+                'completion_tokens': totals['eval_count'],
+                'total_duration_seconds': seconds['total_duration'],
+                'load_duration_seconds': seconds['load_duration'],
+                'prompt_eval_duration_seconds': seconds['prompt_eval_duration'],
+                'eval_duration_seconds': seconds['eval_duration'],
+                'rate_limit_wait_seconds': self.rate_limit_wait_total,
+                'wall_time_seconds': self.wall_time_total,
+                'mean_rate_limit_wait_seconds': self.rate_limit_wait_total / self.rate_limit_waits if self.rate_limit_waits else 0.0,
+            }
+        snapshot['prompt_tokens_per_sec'] = (totals['prompt_eval_count'] / seconds['prompt_eval_duration']
+                                             if seconds['prompt_eval_duration'] else 0.0)
+        snapshot['completion_tokens_per_sec'] = (totals['eval_count'] / seconds['eval_duration']
+                                                 if seconds['eval_duration'] else 0.0)
+        # Without streaming the first token arrives once the model is loaded and the prompt evaluated.
+        snapshot['mean_time_to_first_token_seconds'] = (
+            (seconds['load_duration'] + seconds['prompt_eval_duration']) / requests if requests else 0.0)
+        snapshot['rows_per_sec'] = (snapshot['rows'] / snapshot['generation_seconds']
+                                    if snapshot['generation_seconds'] else 0.0)
+        snapshot['wall_time_p50_seconds'] = percentile(wall_times, 0.50)
+        snapshot['wall_time_p95_seconds'] = percentile(wall_times, 0.95)
+        snapshot['rate_limit_wait_p95_seconds'] = percentile(rate_limit_waits, 0.95)
+        # Measured on the client, and only while streaming.
+        snapshot['first_token_p50_seconds'] = percentile(first_tokens, 0.50)
+        snapshot['first_token_p95_seconds'] = percentile(first_tokens, 0.95)
+        snapshot['last_first_token_seconds'] = first_tokens[-1] if first_tokens else 0.0
+        if self.hosts is not None:
+            snapshot['hosts'] = self.hosts.stats()
+        return snapshot
+
+    def summary(self):
+        snapshot = self.snapshot()
+        server = snapshot['total_duration_seconds'] or 1.0
+        return (f"{snapshot['rows']} rows in {snapshot['requests']} requests, {snapshot['errors']} errors, {snapshot['retries']} retries, "
+                f"{snapshot['dead_letters']} dead letters, {snapshot['cache_hits']} cache hits, "
+                f"{snapshot['deduplicated']} duplicates skipped. "
+                f"Model load {snapshot['model_load_seconds']:.1f} s, then {snapshot['rows_per_sec']:.1f} rows/s. "
+                f"Server time: load {snapshot['load_duration_seconds'] / server:.0%}, "
+                f"prompt eval {snapshot['prompt_eval_duration_seconds'] / server:.0%} "
+                f"({snapshot['prompt_tokens_per_sec']:.0f} tok/s), "
+                f"decode {snapshot['eval_duration_seconds'] / server:.0%} "
+                f"({snapshot['completion_tokens_per_sec']:.0f} tok/s). "
+                f"Mean rate-limit wait {snapshot['mean_rate_limit_wait_seconds'] * 1000:.1f} ms, "
+                f"p95 request {snapshot['wall_time_p95_seconds'] * 1000:.0f} ms."
+                + (f" Time to first token p50 {snapshot['first_token_p50_seconds'] * 1000:.0f} ms, "
+                   f"p95 {snapshot['first_token_p95_seconds'] * 1000:.0f} ms." if snapshot['streamed_tokens'] else ''))
+
+    def to_prometheus(self):
+        return to_prometheus({None: self})
+
+
+def to_prometheus(members):
+    """Prometheus text for {model: Metrics}: each sample is labelled with its model, unless the key is None."""
+    snapshots = {model: metrics.snapshot() for model, metrics in members.items()}
+    lines = []
+
+    def metric(name, kind, help_text, key):
+        lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+        for model, snapshot in snapshots.items():
+            label = '' if model is None else f'{{model="{model}"}}'
+            lines.append(f'{PREFIX}_{name}{label} {snapshot[key]}')
+
+
+    metric('requests_total', 'counter', 'Completed Ollama requests.', 'requests')
+    metric('rows_total', 'counter', 'Rows answered, by the model, the cache or a duplicate.', 'rows')
+    metric('request_errors_total', 'counter', 'Failed Ollama requests.', 'errors')
+    metric('retries_total', 'counter', 'Requests retried after a transient failure.', 'retries')
+    metric('dead_letters_total', 'counter', 'Rows given up on after every retry.', 'dead_letters')
+    metric('deduplicated_rows_total', 'counter', 'Duplicate rows answered without a model call.',
+           'deduplicated')
+    metric('cache_hits_total', 'counter', 'Rows answered from the response cache.', 'cache_hits')
+    metric('prompt_tokens_total', 'counter', 'Prompt tokens evaluated.', 'prompt_tokens')
+    metric('completion_tokens_total', 'counter', 'Tokens generated.', 'completion_tokens')
+    for field in ('total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration',
+                  'rate_limit_wait', 'wall_time'):
+        metric(f'{field}_seconds_total', 'counter', f'Sum of per-request {field.replace("_", " ")}.',
+               f'{field}_seconds')
+    metric('model_load_seconds', 'gauge', 'Time spent preloading the model before generating.',
+           'model_load_seconds')
+    metric('rows_per_second', 'gauge', 'Rows answered per second since the model was loaded.', 'rows_per_sec')
+    metric('prompt_tokens_per_second', 'gauge', 'Prompt eval throughput.', 'prompt_tokens_per_sec')
+    metric('completion_tokens_per_second', 'gauge', 'Decode throughput.', 'completion_tokens_per_sec')
+    metric('time_to_first_token_seconds', 'gauge', 'Mean time to first token.',
+           'mean_time_to_first_token_seconds')
+    metric('streamed_tokens_total', 'counter', 'Tokens received so far in streaming mode.',
+           'streamed_tokens')
+    metric('first_token_p95_seconds', 'gauge', 'p95 measured time to first streamed token (recent window).',
+           'first_token_p95_seconds')
+    metric('wall_time_p95_seconds', 'gauge', 'p95 client-side request time (recent window).',
+           'wall_time_p95_seconds')
+    # Every model shares the same host pool, so its per-host series are written once.
+    hosts = next((snapshot['hosts'] for snapshot in snapshots.values() if snapshot.get('hosts')), None)
+    for name, key, kind, help_text in (
+            ('host_requests_total', 'requests', 'counter', 'Completed requests per Ollama host.'),
+            ('host_errors_total', 'errors', 'counter', 'Failed requests per Ollama host.'),
+            ('host_overloads_total', 'overloads', 'counter', '429/503 replies per Ollama host.'),
+            ('host_in_flight', 'in_flight', 'gauge', 'Requests currently running per Ollama host.'),
+            ('host_mean_seconds', 'mean_seconds', 'gauge', 'Moving-average request time per Ollama host.'),
+            ('host_up', 'up', 'gauge', '1 if the Ollama host is currently in rotation.')):
+        if not hosts:
+            break
+        lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+        for host in hosts:
+            lines.append(f'{PREFIX}_{name}{{host="{host["host"]}"}} {int(host[key]) if key == "up" else host[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsGroup:
+    """The per-model Metrics of a multi-model run, served and dumped as one."""
+
+    def __init__(self, members):
+        self.members = members
+
+    def snapshot(self):
+        return {model: metrics.snapshot() for model, metrics in self.members.items()}
+
+    def to_prometheus(self):
+        return to_prometheus(self.members)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = self.server.metrics.to_prometheus(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(self.server.metrics.snapshot()), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve_metrics(metrics, port, host='127.0.0.1'):
+    """Expose metrics at http://host:port/metrics (Prometheus) and /metrics.json on a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class MetricsDumper:
+    """Rewrites a JSON snapshot of `metrics` to `path` every `interval` seconds until stopped."""
+
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _loop(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(self.metrics.snapshot(), file, indent=2)
+        os.replace(temporary, self.path)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.dump()
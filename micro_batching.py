@@ -0,0 +1,86 @@
+import json
+import statistics
+import threading
+
+DEFAULT_MAX_BATCH = 16
+BATCH_INSTRUCTIONS = ("Answer each of the following {count} prompts independently, as if it were the only one. "
+                      "Reply with a JSON object whose \"answers\" array holds exactly {count} strings, "
+                      "the i-th answering the i-th prompt.")
+
+
+class BatchParseError(ValueError):
+    pass
+
+
+def batch_format(count):
+    """JSON schema passed as Ollama's `format` so the reply is constrained to `count` answers."""
+    return {
+        'type': 'object',
+        'properties': {
+            'answers': {'type': 'array', 'items': {'type': 'string'}, 'minItems': count, 'maxItems': count},
+        },
+        'required': ['answers'],
+    }
+
+
+def build_batch_prompt(system_prompt, prompts):
+    instructions = BATCH_INSTRUCTIONS.format(count=len(prompts))
+    numbered = json.dumps([{'prompt': prompt} for prompt in prompts], ensure_ascii=False, indent=1)
+    return f"{system_prompt}\n\n{instructions}\n\n{numbered}" if system_prompt else f"{instructions}\n\n{numbered}"
+
+
+def parse_batch_reply(text, count):
+    """Return the `count` answers in a packed reply, or raise BatchParseError."""
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.strip('`').removeprefix('json').strip()
+    try:
+        reply = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise BatchParseError(f"Reply is not JSON: {e}") from None
+    answers = reply.get('answers') if isinstance(reply, dict) else reply
+    if not isinstance(answers, list) or len(answers) != count:
+        raise BatchParseError(f"Expected {count} answers, got {len(answers) if isinstance(answers, list) else 'none'}.")
+    if not all(isinstance(answer, str) for answer in answers):
+        raise BatchParseError("Answers must be strings.")
+    return answers
+
+
+class BatchSizer:
+    """Picks how many rows go into one request by hill-climbing on completion tokens/sec.
+
+    The size doubles while each doubling still raises the median throughput of `window`
+    requests by at least `min_gain`, and halves when it stops paying off or a packed reply
+    cannot be parsed. It keeps probing, so it follows the server as load changes.
+    """
+
+    def __init__(self, maximum=DEFAULT_MAX_BATCH, initial=2, window=4, min_gain=0.1):
+        self.maximum = max(1, maximum)
+        self.size = min(initial, self.maximum)
+        self.window = window
+        self.min_gain = min_gain
+        self.lock = threading.Lock()
+        self.samples = []
+        self.rates = {}
+
+    def record(self, rows, tokens, seconds):
+        with self.lock:
+            # Requests sized before the last change say nothing about the current size.
+            if rows != self.size or seconds <= 0:
+                return
+            self.samples.append(tokens / seconds)
+            if len(self.samples) < self.window:
+                return
+            rate = statistics.median(self.samples)
+            self.samples = []
+            self.rates[self.size] = rate
+            smaller = self.rates.get(self.size // 2)
+            if smaller is not None and rate < smaller * (1 + self.min_gain):
+                self.size //= 2
+            elif self.size < self.maximum:
+                self.size = min(self.size * 2, self.maximum)
+
+    def record_failure(self):
+        with self.lock:
+            self.size = max(1, self.size // 2)
+            self.samples = []
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 11435
+WORD = 'lorem'
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    """Stand-in for the parts of the Ollama HTTP API the generators use, with tunable timing.
+
+    Every reply takes `latency` +/- `jitter` seconds plus `response_tokens / tokens_per_sec`
+    to "decode", and fails with HTTP 500 at `error_rate`. Timing fields mirror Ollama's
+    (nanoseconds), so the client-side instrumentation sees realistic values. A `format`
+    schema asking for an `answers` array gets that many answers, each `response_tokens` long.
+    The first request for a model takes `load_seconds` extra; `keep_alive: 0` unloads it.
+    With `max_in_flight`, a generation request arriving while that many are being served is
+    answered with HTTP 429 at once, like a rate-limited endpoint.
+
+    Like Ollama's runner, each of `num_parallel` slots remembers the last prompt it evaluated.
+    A request reuses the slot sharing its longest prefix and only the rest is counted in
+    `prompt_eval_count` and timed; `prompt_cache=False` evaluates every prompt in full.
+    """
+
+    daemon_threads = True
+    # Ollama takes bursts of hundreds of connections; socketserver's default backlog of 5 refuses them.
+    request_queue_size = 1024
+
+    def __init__(self, address, latency=0.0, jitter=0.0, tokens_per_sec=0.0, response_tokens=32,
+                 prompt_tokens_per_sec=0.0, error_rate=0.0, load_seconds=0.0, num_parallel=4, prompt_cache=True,
+                 max_in_flight=0, seed=None):
+        super().__init__(address, MockOllamaHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_sec = tokens_per_sec
+        self.response_tokens = response_tokens
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.error_rate = error_rate
+        self.load_seconds = load_seconds
+        self.loaded = set()
+        self.slots = [''] * max(1, num_parallel)
+        self.prompt_cache = prompt_cache
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.rejected = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def plan(self, prompt_tokens):
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            jitter = self.random.uniform(-self.jitter, self.jitter)
+        prompt_seconds = prompt_tokens / self.prompt_tokens_per_sec if self.prompt_tokens_per_sec else 0.0
+        eval_seconds = self.response_tokens / self.tokens_per_sec if self.tokens_per_sec else 0.0
+        return failed, max(self.latency + jitter, 0.0), prompt_seconds, eval_seconds
+
+    def admit(self):
+        with self.lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def evaluate(self, prompt):
+        """Return the prompt tokens left to evaluate after reusing the best slot's cached prefix."""
+        cached = 0
+        if self.prompt_cache:
+            with self.lock:
+                shared = [len(os.path.commonprefix([previous, prompt])) for previous in self.slots]
+                cached = max(shared)
+                slot = shared.index(cached) if cached else self.requests % len(self.slots)
+                self.slots[slot] = prompt
+        return max((len(prompt) - cached) // 4, 1)
+
+    def load(self, model, keep_alive):
+        """Track residency; returns seconds spent loading `model` for this request."""
+        with self.lock:
+            if keep_alive == 0:
+                self.loaded.discard(model)
+                return 0.0
+            if model in self.loaded:
+                return 0.0
+            self.loaded.add(model)
+        time.sleep(self.load_seconds)
+        return self.load_seconds
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without this Nagle + delayed ACK adds ~40 ms.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.send_json({'models': [{'name': 'mock:latest', 'model': 'mock:latest'}]})
+        elif self.path == '/api/version':
+            self.send_json({'version': '0.0.0-mock'})
+        else:
+            self.send_text('Ollama is running')
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path not in ('/api/chat', '/api/generate'):
+            self.send_json({'error': f'unknown endpoint {self.path}'}, status=404)
+            return
+        chat = self.path == '/api/chat'
+        messages = body.get('messages', [])
+        prompt = ' '.join(message.get('content', '') for message in messages) if chat else body.get('prompt', '')
+        load_seconds = self.server.load(body.get('model', 'mock'), body.get('keep_alive'))
+        if not prompt:
+            # Ollama's load/unload request: no generation, just the residency change.
+            reply = {'model': body.get('model', 'mock'), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                     'done': True, 'done_reason': 'unload' if body.get('keep_alive') == 0 else 'load',
+                     'load_duration': int(load_seconds * 1e9), 'total_duration': int(load_seconds * 1e9)}
+            reply.update({'message': {'role': 'assistant', 'content': ''}} if chat else {'response': ''})
+            self.send_json(reply)
+            return
+        if not self.server.admit():
+            self.send_json({'error': 'too many requests'}, status=429)
+            return
+        try:
+            self.generate(body, chat, messages, prompt, load_seconds)
+        finally:
+            self.server.leave()
+
+    def generate(self, body, chat, messages, prompt, load_seconds):
+        # Stand-in for the chat template: what the model actually sees, role markers included.
+        templated = ''.join(f"<|{message.get('role')}|>{message.get('content', '')}<|end|>" for message in messages) \
+            if chat else prompt
+        prompt_tokens = self.server.evaluate(templated)
+        failed, latency, prompt_seconds, eval_seconds = self.server.plan(prompt_tokens)
+
+        started = time.perf_counter()
+        time.sleep(latency + prompt_seconds)
+        if failed:
+            self.send_json({'error': 'mock server error'}, status=500)
+            return
+
+        answers = ((body.get('format') or {}).get('properties', {}).get('answers', {}).get('minItems')
+                   if isinstance(body.get('format'), dict) else None)
+        tokens = self.server.response_tokens * (answers or 1)
+        eval_seconds *= answers or 1
+        answer = ' '.join([WORD] * self.server.response_tokens)
+        text = json.dumps({'answers': [answer] * answers}) if answers else answer
+        final = {
+            'model': body.get('model', 'mock'),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'done': True,
+            'done_reason': 'stop',
+            'load_duration': int(load_seconds * 1e9),
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(prompt_seconds * 1e9),
+            'eval_count': tokens,
+            'eval_duration': int(eval_seconds * 1e9),
+        }
+        if body.get('stream', True):
+            self.stream(final, chat, text, eval_seconds, started)
+        else:
+            time.sleep(eval_seconds)
+            final['total_duration'] = int((time.perf_counter() - started) * 1e9)
+            final.update({'message': {'role': 'assistant', 'content': text}} if chat else {'response': text})
+            self.send_json(final)
+
+    def stream(self, final, chat, text, eval_seconds, started):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        pieces = text.split(' ')
+        delay = eval_seconds / len(pieces)
+        for position, piece in enumerate(pieces):
+            time.sleep(delay)
+            piece = piece if position == 0 else f' {piece}'
+            chunk = {'model': final['model'], 'created_at': final['created_at'], 'done': False}
+            chunk.update({'message': {'role': 'assistant', 'content': piece}} if chat else {'response': piece})
+            self.write_chunk(chunk)
+        final['total_duration'] = int((time.perf_counter() - started) * 1e9)
+        final.update({'message': {'role': 'assistant', 'content': ''}} if chat else {'response': ''})
+        self.write_chunk(final)
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, payload):
+        data = (json.dumps(payload) + '\n').encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def send_json(self, payload, status=200):
+        self.send_bytes(json.dumps(payload).encode('utf-8'), 'application/json', status)
+
+    def send_text(self, text, status=200):
+        self.send_bytes(text.encode('utf-8'), 'text/plain', status)
+
+    def send_bytes(self, data, content_type, status):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(host='127.0.0.1', port=0, **config):
+    """Start a MockOllamaServer on a background thread; port 0 picks a free port."""
+    server = MockOllamaServer((host, port), **config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.0, help="Fixed seconds added to every request.")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Uniform +/- seconds added to the latency.")
+    parser.add_argument('--tokens-per-sec', type=float, default=0.0, help="Decode speed; 0 means instant.")
+    parser.add_argument('--response-tokens', type=int, default=32, help="Tokens in every reply.")
+    parser.add_argument('--prompt-tokens-per-sec', type=float, default=0.0, help="Prompt eval speed; 0 means instant.")
+    parser.add_argument('--num-parallel', type=int, default=4, help="Slots that each keep a prompt cache.")
+    parser.add_argument('--no-prompt-cache', action='store_true', help="Evaluate every prompt in full.")
+    parser.add_argument('--load-seconds', type=float, default=0.0, help="Time to load a model on first use.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+    parser.add_argument('--max-in-flight', type=int, default=0,
+                        help="Answer requests beyond this many at once with HTTP 429 (default: no limit).")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for jitter and errors.")
+
+
+def server_config(args):
+    return {
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'tokens_per_sec': args.tokens_per_sec,
+        'response_tokens': args.response_tokens,
+        'prompt_tokens_per_sec': args.prompt_tokens_per_sec,
+        'error_rate': args.error_rate,
+        'load_seconds': args.load_seconds,
+        'num_parallel': args.num_parallel,
+        'prompt_cache': not args.no_prompt_cache,
+        'max_in_flight': args.max_in_flight,
+        'seed': args.seed,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama API for benchmarks.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server = MockOllamaServer((args.host, args.port), **server_config(args))
+    print(f"Mock Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
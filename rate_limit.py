@@ -0,0 +1,179 @@
+import threading
+import time
+
+from estimator import format_duration
+from resilience import sleep_unless_stopped
+
+# Share of full speed a run may be slowed to, and how fast it climbs back once overloads stop.
+MIN_SCALE = 1 / 16
+RECOVERY_PER_SEC = 0.05
+SLOT_POLL_SECONDS = 0.05
+EWMA_ALPHA = 0.2
+
+
+class TokenBucket:
+    """Holds up to `capacity` units and refills at `rate` units per second.
+
+    A take larger than the capacity goes through once the bucket is full and leaves it in
+    debt, so the average rate holds for requests of any size.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_take(self, amount, scale=1.0):
+        """Take `amount` now and return 0, or return the seconds until it could be taken."""
+        with self.lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * scale)
+            self.updated = now
+            needed = min(amount, self.capacity)
+            if self.level >= needed:
+                self.level -= amount
+                return 0.0
+            return (needed - self.level) / (self.rate * scale)
+
+    def charge(self, amount):
+        """Take (or, if negative, give back) `amount` without waiting, e.g. to settle an estimate."""
+        with self.lock:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """Token-bucket limits on requests per second and tokens per minute, slowed down by overloads.
+
+    A request is charged its estimated tokens (prompt plus the moving average of replies)
+    up front and settled with the server's real counts afterwards. Each 429 or 503 that
+    reaches it (with a HostPool, only once every host has refused the request) halves
+    the limiter's speed: both rates and the number of requests kept in flight, down to
+    MIN_SCALE of full speed. Overloads from requests sent before the last slow-down are
+    ignored, so one burst only counts once. Speed then recovers by RECOVERY_PER_SEC of full
+    speed per second. With no rates configured, only the requests in flight are adapted; a
+    request waiting out a retry backoff does not count as in flight.
+
+    One limiter can be shared by several generators (e.g. every model of a fan-out) to
+    limit them together.
+    """
+
+    def __init__(self, requests_per_sec=None, tokens_per_min=None, adaptive=True):
+        self.requests_per_sec = requests_per_sec
+        self.tokens_per_min = tokens_per_min
+        self.requests = TokenBucket(requests_per_sec, max(1.0, requests_per_sec)) if requests_per_sec else None
+        self.tokens = TokenBucket(tokens_per_min / 60, tokens_per_min / 60) if tokens_per_min else None
+        self.adaptive = adaptive
+        self.lock = threading.Lock()
+        self.base_scale = 1.0
+        self.changed = time.perf_counter()
+        self.slowed_at = float('-inf')
+        self.overloads = 0
+        self.slowdowns = 0
+        self.reply_tokens = None
+
+    def scale(self):
+        with self.lock:
+            return self._scale(time.perf_counter())
+
+    def _scale(self, now):
+        return min(1.0, self.base_scale + (now - self.changed) * RECOVERY_PER_SEC)
+
+    def allowed(self, concurrency):
+        """Requests that may be in flight out of `concurrency` at the current speed."""
+        return max(1, int(concurrency * self.scale()))
+
+    def estimate(self, prompt_tokens):
+        return prompt_tokens + int(self.reply_tokens or 0)
+
+    async def acquire(self, tokens, should_continue):
+        """Wait until one request of `tokens` fits both limits; False if should_continue() turns False first."""
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is None:
+                continue
+            while True:
+                wait = bucket.try_take(amount, self.scale())
+                if not wait:
+                    break
+                if not await sleep_unless_stopped(wait, should_continue):
+                    return False
+        return True
+
+    async def wait_for_slot(self, sending, concurrency, should_continue):
+        """Hold a request back while `sending()` requests already fill the slowed-down concurrency."""
+        while sending() >= self.allowed(concurrency):
+            if not await sleep_unless_stopped(SLOT_POLL_SECONDS, should_continue):
+                return False
+        return True
+
+    def record_response(self, estimated, used, reply_tokens):
+        with self.lock:
+            if reply_tokens:
+                if self.reply_tokens is None:
+                    self.reply_tokens = reply_tokens
+                else:
+                    self.reply_tokens += EWMA_ALPHA * (reply_tokens - self.reply_tokens)
+        if self.tokens is not None:
+            self.tokens.charge(used - estimated)
+
+    def record_overload(self, sent_at):
+        """Slow down after a 429/503 for a request sent at perf_counter() time `sent_at`."""
+        with self.lock:
+            self.overloads += 1
+            if not self.adaptive or sent_at < self.slowed_at:
+                return
+            now = time.perf_counter()
+            self.base_scale = max(MIN_SCALE, self._scale(now) / 2)
+            self.changed = self.slowed_at = now
+            self.slowdowns += 1
+            if self.slowdowns > 1:
+                return
+        print("Warning: the server is overloaded (429/503); slowing down until it stops refusing requests.")
+
+    def summary(self):
+        limits = [f"{self.requests_per_sec:g} requests/s" if self.requests_per_sec else None,
+                  f"{self.tokens_per_min:g} tokens/min" if self.tokens_per_min else None]
+        limits = ', '.join(limit for limit in limits if limit) or 'no fixed limits'
+        return (f"{limits}; {self.overloads} overload responses, slowed down {self.slowdowns} times, "
+                f"now at {self.scale():.0%} of full speed.")
+
+
+class Budget:
+    """A cap on a run's tokens (prompt plus reply, as the server counts them) and/or wall time.
+
+    Once it is reached no new request is sent; those in flight finish and are saved, so a
+    resumed run carries on where this one stopped. Shared by several generators, it caps
+    them together; the clock starts with the first run.
+    """
+
+    def __init__(self, max_tokens=None, max_seconds=None):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.lock = threading.Lock()
+        self.tokens = 0
+        self.started = None
+        self.reason = None
+
+    def start(self):
+        with self.lock:
+            if self.started is None:
+                self.started = time.monotonic()
+
+    def spend(self, tokens):
+        with self.lock:
+            self.tokens += tokens
+
+    def exhausted(self):
+        with self.lock:
+            if self.reason is None:
+                if self.max_tokens is not None and self.tokens >= self.max_tokens:
+                    self.reason = f"token budget of {self.max_tokens} reached"
+                elif (self.max_seconds is not None and self.started is not None
+                      and time.monotonic() - self.started >= self.max_seconds):
+                    self.reason = f"time budget of {format_duration(self.max_seconds)} reached"
+            return self.reason is not None
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started if self.started is not None else None
+        return f"{self.reason or 'budget not reached'}; {self.tokens} tokens used in {format_duration(elapsed)}"
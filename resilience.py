@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+from host_pool import is_host_failure, is_host_overloaded
+
+DEFAULT_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+POLL_SECONDS = 0.25
+
+
+def dead_letter_path(output_path):
+    return f'{output_path}.failed.jsonl'
+
+
+class RunStopped(Exception):
+    """Raised inside a request that was still waiting for its turn when the run stopped."""
+
+
+def is_retryable(error):
+    """Transport failures, timeouts, 5xx and 429 are worth another try; other errors are not."""
+    return is_host_failure(error) or is_host_overloaded(error)
+
+
+async def sleep_unless_stopped(seconds, should_continue):
+    """Sleep in short steps so a stop request is noticed; returns should_continue()."""
+    deadline = time.monotonic() + seconds
+    while True:
+        if not should_continue():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return True
+        await asyncio.sleep(min(remaining, POLL_SECONDS))
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n waits uniform(0, min(max_delay, base_delay * 2**(n-1)))."""
+
+    def __init__(self, attempts=DEFAULT_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Stops requests after `failure_threshold` consecutive failures, for `reset_seconds`.
+
+    After that one probe request is let through (half-open): success closes the breaker,
+    failure opens it for another `reset_seconds`, and an overload reply (429/503) hands the
+    probe slot to the next request without deciding either way.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_seconds=DEFAULT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None and (
+                self.probing or time.monotonic() - self.opened_at < self.reset_seconds)
+
+    def _try_acquire(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.probing = True
+            return True
+
+    async def acquire(self, should_continue):
+        """Wait until a request may be sent; returns False if should_continue() turns False first."""
+        while not self._try_acquire():
+            if not await sleep_unless_stopped(POLL_SECONDS, should_continue):
+                return False
+        return True
+
+    async def wait_closed(self, should_continue):
+        """Hold new dispatches back while the breaker is open, without taking the probe slot."""
+        while self.is_open:
+            if not await sleep_unless_stopped(POLL_SECONDS, should_continue):
+                return False
+        return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release_probe(self):
+        """Free the probe slot without closing or reopening the breaker."""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if not self.probing:
+                    self.trips += 1
+                    print(f"Warning: {self.failures} requests failed in a row; "
+                          f"pausing requests for {self.reset_seconds:.0f} s.")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class DeadLetters:
+    """JSONL file of rows that still failed after every retry, with the error and attempt count.
+
+    Failed rows are not journaled, so a resumed run tries them again; the file is rewritten
+    every run and only lists rows that are still failing. It is only created once a row
+    fails, and a previous run's file is removed so a clean run leaves none behind.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.lock = threading.Lock()
+        self.file = None
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def append(self, index, parts, error, attempts):
+        record = {'index': index, 'prompt': list(parts), 'error': f'{type(error).__name__}: {error}',
+                  'attempts': attempts}
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'w', encoding='utf-8')
+            self.file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            self.file.flush()
+            self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class FailedRow:
+    """Result of a row whose request could not be completed."""
+
+    def __init__(self, error, attempts, stopped=False):
+        self.error = error
+        self.attempts = attempts
+        self.stopped = stopped
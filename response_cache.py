@@ -0,0 +1,91 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = 'response_cache.sqlite3'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(model_name, *parts):
+    payload = json.dumps([model_name, *parts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """On-disk, content-addressed store of completions with size-bounded LRU eviction.
+
+    Safe to share between the dispatcher's worker threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY,'
+            ' response TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self.connection.commit()
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.connection.commit()
+            return row[0]
+
+    def put(self, key, response):
+        size = len(response.encode('utf-8'))
+        with self.lock:
+            previous = self.connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses (key, response, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, response, size, time.time()),
+            )
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until we are comfortably under the limit.
+        target = self.max_bytes * 0.9
+        rows = self.connection.execute('SELECT key, size FROM responses ORDER BY last_used')
+        doomed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            doomed.append((key,))
+            self.total_bytes -= size
+        self.connection.executemany('DELETE FROM responses WHERE key = ?', doomed)
+
+    def stats(self):
+        with self.lock:
+            entries = self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': self.total_bytes,
+        }
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,209 @@
+import csv
+import json
+import os
+
+import pandas as pd
+
+DEFAULT_BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 1 << 20
+COUNT_CHUNK_SIZE = 1 << 24
+
+FORMATS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.jsonl': 'jsonl',
+    '.parquet': 'parquet',
+}
+
+
+def detect_format(path):
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported input format: {path}")
+    if fmt == 'json' and _first_char(path) != '[':
+        # Plenty of '.json' datasets are really one record per line.
+        fmt = 'jsonl'
+    return fmt
+
+
+def _first_char(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        while True:
+            char = file.read(1)
+            if not char or not char.isspace():
+                return char
+
+
+def _iter_json_array(path, chunk_size=JSON_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer = file.read(chunk_size)
+        pos = buffer.index('[') + 1
+        eof = False
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError('Buffer exhausted', buffer, pos)
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = file.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            yield item
+            if pos >= chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def _count_csv_rows(path):
+    """Data rows of a CSV file, counting newlines in C unless a quoted field could hide one."""
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(COUNT_CHUNK_SIZE)
+            if not chunk:
+                break
+            if b'"' in chunk:
+                return None
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+class RowSource:
+    """Lazy, batch-at-a-time reader over a CSV, JSON, JSONL or Parquet dataset.
+
+    The row count and column names come from file metadata (or a single streaming pass
+    for text formats), so nothing is materialised until rows are actually requested.
+    A CSV file without quotes is counted by its newlines; one with quoted fields, and
+    JSON, still take a full parsing pass.
+    """
+
+    def __init__(self, path, fmt=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.format = fmt or detect_format(path)
+        self.batch_size = batch_size
+        self._num_rows = None
+        self._columns = None
+
+    def __len__(self):
+        if self._num_rows is None:
+            self._num_rows = self._count_rows()
+        return self._num_rows
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._columns = self._read_columns()
+        return self._columns
+
+    def _count_rows(self):
+        if self.format == 'parquet':
+            return self._parquet_file().metadata.num_rows
+        if self.format == 'csv':
+            rows = _count_csv_rows(self.path)
+            if rows is not None:
+                return rows
+            with open(self.path, 'r', encoding='utf-8', newline='') as file:
+                return max(sum(1 for _ in csv.reader(file)) - 1, 0)
+        if self.format == 'jsonl':
+            with open(self.path, 'rb') as file:
+                return sum(1 for line in file if line.strip())
+        return sum(1 for _ in _iter_json_array(self.path))
+
+    def _read_columns(self):
+        if self.format == 'parquet':
+            return list(self._parquet_file().schema_arrow.names)
+        if self.format == 'csv':
+            with open(self.path, 'r', encoding='utf-8', newline='') as file:
+                return next(csv.reader(file), [])
+        records = _iter_jsonl(self.path) if self.format == 'jsonl' else _iter_json_array(self.path)
+        return list(next(records, {}).keys())
+
+    def _parquet_file(self):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(self.path)
+
+    def iter_batches(self, start=0, stop=None, batch_size=None, columns=None):
+        """Yield DataFrames covering rows [start, stop), indexed by absolute row number,
+        with only `columns` if given."""
+        batch_size = batch_size or self.batch_size
+        offset = start
+        for batch in self._iter_raw_batches(start, batch_size):
+            if columns is not None:
+                batch = batch[list(columns)]
+            if stop is not None and offset >= stop:
+                return
+            if stop is not None and offset + len(batch) > stop:
+                batch = batch.iloc[:stop - offset]
+            batch.index = pd.RangeIndex(offset, offset + len(batch))
+            offset += len(batch)
+            yield batch
+
+    def _iter_raw_batches(self, start, batch_size):
+        if self.format == 'parquet':
+            yield from self._iter_parquet(start, batch_size)
+        elif self.format == 'csv':
+            # Blank lines are rows like any other, so row numbers match the counted lines whatever `start` is.
+            reader = pd.read_csv(self.path, chunksize=batch_size, skiprows=range(1, start + 1),
+                                 keep_default_na=False, skip_blank_lines=False)
+            yield from reader
+        else:
+            records = _iter_jsonl(self.path) if self.format == 'jsonl' else _iter_json_array(self.path)
+            batch = []
+            for position, record in enumerate(records):
+                if position < start:
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield pd.DataFrame(batch)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch)
+
+    def _iter_parquet(self, start, batch_size):
+        parquet_file = self._parquet_file()
+        metadata = parquet_file.metadata
+        # Skip whole row groups that end before `start` using the footer alone.
+        first_group, skipped = 0, 0
+        while first_group < metadata.num_row_groups and skipped + metadata.row_group(first_group).num_rows <= start:
+            skipped += metadata.row_group(first_group).num_rows
+            first_group += 1
+        row_groups = list(range(first_group, metadata.num_row_groups))
+        if not row_groups:
+            return
+        to_skip = start - skipped
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups):
+            batch = record_batch.to_pandas()
+            if to_skip:
+                dropped = min(to_skip, len(batch))
+                batch = batch.iloc[dropped:]
+                to_skip -= dropped
+            if len(batch):
+                yield batch
+
+    def read(self, start=0, stop=None):
+        """Materialise rows [start, stop) as a single DataFrame."""
+        batches = list(self.iter_batches(start, stop))
+        if not batches:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(batches)
@@ -0,0 +1,22 @@
+SCHEDULES = ('file', 'longest-first')
+DEFAULT_SCHEDULE_WINDOW = 10000
+
+
+async def longest_first(jobs, window, cost):
+    """Reorder the async iterator `jobs` so that within every `window` consecutive jobs the costliest go first.
+
+    Handing the sorted queue to whichever slot frees up next is longest-processing-time-first
+    list scheduling, the greedy bin-packing of rows onto workers: long prompts start early
+    and the short ones fill the gaps, so no slot is left working on a huge row at the end.
+    """
+    buffer = []
+    async for job in jobs:
+        buffer.append(job)
+        if len(buffer) >= window:
+            buffer.sort(key=cost, reverse=True)
+            for job in buffer:
+                yield job
+            buffer = []
+    buffer.sort(key=cost, reverse=True)
+    for job in buffer:
+        yield job
@@ -0,0 +1,89 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class DatasetSchema:
+    """Declarative description of a dataset layout: which columns are sent to the model,
+    how they are templated after the system prompt, and which column receives the answer."""
+
+    name: str
+    prompt_columns: tuple
+    output_column: str
+    input_path: str
+    output_path: str
+    prompt_template: str = None
+    download_url: str = None
+    required_columns: tuple = ()
+
+    def render(self, system_prompt, parts):
+        if self.prompt_template is None:
+            return ' '.join([system_prompt, *map(str, parts)])
+        return self.prompt_template.format(system_prompt=system_prompt, **dict(zip(self.prompt_columns, parts)))
+
+    def render_row(self, parts):
+        """The row's own text, for when the system prompt travels as a separate system message."""
+        if self.prompt_template is None:
+            return ' '.join(map(str, parts))
+        return self.prompt_template.format(system_prompt='', **dict(zip(self.prompt_columns, parts))).strip()
+
+    def missing_columns(self, columns):
+        return [column for column in [*self.prompt_columns, *self.required_columns] if column not in columns]
+
+    def ensure_input(self, path=None):
+        """Download the dataset to `path` (default: input_path) if it is missing and has a known URL."""
+        path = path or self.input_path
+        if not os.path.exists(path) and self.download_url:
+            import requests
+            with requests.get(self.download_url, stream=True) as response:
+                response.raise_for_status()
+                with open(path, 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=1 << 20):
+                        file.write(chunk)
+        return path
+
+
+SCHEMAS = {
+    'qna': DatasetSchema(
+        name='qna',
+        prompt_columns=('prompt',),
+        output_column='output',
+        input_path='unfilled_qna_dataset.csv',
+        output_path='filled_qna_dataset.csv',
+    ),
+    'alpaca': DatasetSchema(
+        name='alpaca',
+        prompt_columns=('instruction', 'input'),
+        output_column='output',
+        input_path='alpaca_data_cleaned.json',
+        output_path='filled_qna_dataset.json',
+        download_url='https://huggingface.co/datasets/yahma/alpaca-cleaned/resolve/main/alpaca_data_cleaned.json',
+        required_columns=('output',),
+    ),
+    'openorca': DatasetSchema(
+        name='openorca',
+        prompt_columns=('question',),
+        output_column='response',
+        input_path='1M-GPT4-Augmented_chunk_0.parquet',
+        output_path='filled_qna_dataset.parquet',
+        required_columns=('response',),
+    ),
+}
+
+
+def get_schema(name):
+    try:
+        return SCHEMAS[name]
+    except KeyError:
+        raise ValueError(f"Unknown dataset schema '{name}'. Choose from: {', '.join(SCHEMAS)}") from None
+
+
+def custom_schema(prompt_columns, output_column, input_path=None, output_path=None, prompt_template=None):
+    return DatasetSchema(
+        name='custom',
+        prompt_columns=tuple(prompt_columns),
+        output_column=output_column,
+        input_path=input_path,
+        output_path=output_path,
+        prompt_template=prompt_template,
+    )
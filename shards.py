@@ -0,0 +1,374 @@
+import argparse
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from generation_engine import DEFAULT_CONCURRENCY, Generator
+from host_pool import DEFAULT_TIMEOUT, HostPool, default_hosts
+from journal import journal_path
+from rate_limit import Budget, RateLimiter
+from resilience import dead_letter_path
+from response_cache import DEFAULT_CACHE_PATH, ResponseCache
+from row_source import RowSource
+from schemas import SCHEMAS, custom_schema, get_schema
+from sinks import open_sink
+
+DEFAULT_SHARD_ROWS = 10000
+DEFAULT_LEASE_SECONDS = 300
+POLL_SECONDS = 5
+
+
+@dataclass(frozen=True)
+class Shard:
+    id: int
+    input: str
+    start: int
+    stop: int
+    attempt: int
+    output: str
+    previous_output: str = None
+
+
+def shard_output_path(queue_path, shard_id, attempt, extension):
+    """Every lease of a shard writes its own file, so a worker that lost its lease cannot
+    overwrite the one that took the shard over."""
+    directory = f'{os.path.splitext(queue_path)[0]}.shards'
+    return os.path.join(directory, f'shard-{shard_id:05d}.attempt-{attempt}{extension}')
+
+
+class ShardQueue:
+    """SQLite work queue of row ranges, handed out under expiring leases.
+
+    A shard is 'pending', 'leased' to one worker until its lease expires, or 'done'. A worker
+    renews its lease while it runs; once a lease expires the shard goes to the next worker that
+    asks. Renewal and completion only succeed for the current (worker, attempt), so a worker
+    that was presumed dead cannot complete a shard someone else now holds. Leases use wall-clock
+    time, so nodes sharing a queue need synchronised clocks; SQLite needs a filesystem with
+    working locks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        connection = sqlite3.connect(path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.close()
+        with self.connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS shards ('
+                ' id INTEGER PRIMARY KEY,'
+                ' input TEXT NOT NULL,'
+                ' start INTEGER NOT NULL,'
+                ' stop INTEGER NOT NULL,'
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                ' worker TEXT,'
+                ' attempt INTEGER NOT NULL DEFAULT 0,'
+                ' expires REAL,'
+                ' output TEXT,'
+                ' failed_rows INTEGER NOT NULL DEFAULT 0)'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    def connect(self):
+        # One short-lived connection per call: workers, heartbeats and the coordinator never share one.
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return _Transaction(connection)
+
+    def plan(self, inputs, config, shard_rows=DEFAULT_SHARD_ROWS):
+        """Split every input file into shards of `shard_rows` rows; returns the number of shards."""
+        shards = []
+        for path in inputs:
+            rows = len(RowSource(path))
+            shards.extend((os.path.abspath(path), start, min(start + shard_rows, rows))
+                          for start in range(0, rows, shard_rows))
+        with self.connect() as connection:
+            if connection.execute('SELECT COUNT(*) FROM shards').fetchone()[0]:
+                raise ValueError(f"Queue '{self.path}' is already planned.")
+            connection.execute('INSERT INTO settings (key, value) VALUES (?, ?)', ('config', json.dumps(config)))
+            connection.executemany('INSERT INTO shards (input, start, stop) VALUES (?, ?, ?)', shards)
+        return len(shards)
+
+    def config(self):
+        with self.connect() as connection:
+            row = connection.execute("SELECT value FROM settings WHERE key = 'config'").fetchone()
+        if row is None:
+            raise ValueError(f"Queue '{self.path}' has not been planned.")
+        return json.loads(row[0])
+
+    def lease(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Claim the first pending or expired shard, or return None if there is none right now."""
+        extension = os.path.splitext(self.config()['output'])[1]
+        now = time.time()
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT id, input, start, stop, attempt, output FROM shards"
+                " WHERE state = 'pending' OR (state = 'leased' AND expires < ?) ORDER BY id LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            shard_id, path, start, stop, attempt, previous_output = row
+            output = shard_output_path(self.path, shard_id, attempt + 1, extension)
+            connection.execute(
+                "UPDATE shards SET state = 'leased', worker = ?, attempt = ?, expires = ?, output = ? WHERE id = ?",
+                (worker, attempt + 1, now + lease_seconds, output, shard_id)
+            )
+        return Shard(shard_id, path, start, stop, attempt + 1, output, previous_output)
+
+    def _update_held(self, shard, worker, assignments, values):
+        with self.connect() as connection:
+            cursor = connection.execute(
+                f"UPDATE shards SET {assignments} WHERE id = ? AND worker = ? AND attempt = ? AND state = 'leased'",
+                (*values, shard.id, worker, shard.attempt)
+            )
+            return cursor.rowcount == 1
+
+    def renew(self, shard, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend the lease; False means it was lost to another worker."""
+        return self._update_held(shard, worker, 'expires = ?', (time.time() + lease_seconds,))
+
+    def complete(self, shard, worker, failed_rows=0):
+        return self._update_held(shard, worker, "state = 'done', expires = NULL, failed_rows = ?", (failed_rows,))
+
+    def release(self, shard, worker):
+        """Give a shard back straight away (e.g. on Ctrl-C) instead of waiting for its lease to expire."""
+        return self._update_held(shard, worker, "state = 'pending', expires = NULL", ())
+
+    def shards(self):
+        with self.connect() as connection:
+            return connection.execute(
+                'SELECT id, input, start, stop, state, worker, attempt, expires, output, failed_rows'
+                ' FROM shards ORDER BY id'
+            ).fetchall()
+
+    def counts(self):
+        with self.connect() as connection:
+            return dict(connection.execute('SELECT state, COUNT(*) FROM shards GROUP BY state').fetchall())
+
+
+class _Transaction:
+    """`with queue.connect() as connection:` runs the block in one immediate (write-locked)
+    transaction, so checking and claiming a shard cannot interleave between workers."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.connection.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        finally:
+            self.connection.close()
+
+
+def schema_from_config(config):
+    schema = get_schema(config['schema'])
+    if config.get('prompt_columns') or config.get('output_column') or config.get('prompt_template'):
+        schema = custom_schema(config.get('prompt_columns') or schema.prompt_columns,
+                               config.get('output_column') or schema.output_column,
+                               schema.input_path, schema.output_path,
+                               config.get('prompt_template') or schema.prompt_template)
+    return schema
+
+
+def run_shard(queue, shard, worker, config, lease_seconds, **options):
+    """Generate one leased shard, renewing the lease meanwhile. Returns True if it was completed."""
+    os.makedirs(os.path.dirname(shard.output), exist_ok=True)
+    # Pick up where the previous holder of this shard left off.
+    resume = shard.previous_output is not None and os.path.exists(journal_path(shard.previous_output))
+    if resume:
+        shutil.copyfile(journal_path(shard.previous_output), journal_path(shard.output))
+    generator = Generator(RowSource(shard.input), schema_from_config(config), config['system_prompt'],
+                          config['model'], output_path=shard.output, start=shard.start, stop=shard.stop,
+                          resume=resume, **options)
+    lost = threading.Event()
+    finished = threading.Event()
+
+    def heartbeat():
+        while not finished.wait(lease_seconds / 4):
+            if not queue.renew(shard, worker, lease_seconds):
+                print(f"Warning: lease on shard {shard.id} was lost; abandoning it.")
+                lost.set()
+                return
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        generator.run(checkpoint=lambda: not lost.is_set())
+    except BaseException:
+        if not lost.is_set():
+            queue.release(shard, worker)
+        raise
+    finally:
+        finished.set()
+        thread.join()
+    if lost.is_set():
+        return False
+    if generator.over_budget():
+        # The journal lets whoever leases the shard next carry on from here.
+        queue.release(shard, worker)
+        return False
+    return queue.complete(shard, worker, generator.dead_letters.count)
+
+
+def work(queue, worker=None, lease_seconds=DEFAULT_LEASE_SECONDS, **options):
+    """Lease and run shards until every shard is done or the budget is used up; returns the number
+    this worker completed."""
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    config = queue.config()
+    budget = options.get('budget')
+    completed = 0
+    while budget is None or not budget.exhausted():
+        shard = queue.lease(worker, lease_seconds)
+        if shard is None:
+            counts = queue.counts()
+            if not counts.get('pending') and not counts.get('leased'):
+                return completed
+            # Everything left is leased to other workers; wait in case one of them dies.
+            time.sleep(POLL_SECONDS)
+            continue
+        print(f"Worker {worker}: shard {shard.id} rows {shard.start}-{shard.stop} of '{shard.input}' "
+              f"(attempt {shard.attempt}).")
+        if run_shard(queue, shard, worker, config, lease_seconds, **options):
+            completed += 1
+    return completed
+
+
+def merge(queue, output_path=None):
+    """Concatenate the finished shards, in input order, into one dataset; returns rows written."""
+    config = queue.config()
+    output_path = output_path or config['output']
+    shards = queue.shards()
+    unfinished = [row[0] for row in shards if row[4] != 'done']
+    if unfinished:
+        raise ValueError(f"{len(unfinished)} shards are not done yet (first: {unfinished[0]}).")
+    sink = open_sink(output_path)
+    try:
+        for row in shards:
+            for frame in RowSource(row[8]).iter_batches():
+                sink.write_frame(frame)
+    finally:
+        sink.close()
+    failed = [dead_letter_path(row[8]) for row in shards if row[9]]
+    if failed:
+        print(f"Warning: {sum(row[9] for row in shards)} rows failed after retries and are empty; "
+              f"see {', '.join(failed)}.")
+    return sink.rows_written
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Split datasets into shards in a SQLite queue, fill them with any number of workers "
+                    "(on this or other machines sharing the queue file), then merge the results.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plan = commands.add_parser('plan', help="Create the queue and its shards.")
+    plan.add_argument('inputs', nargs='+', help="Input datasets, e.g. every 1M-GPT4-Augmented chunk.")
+    plan.add_argument('--schema', choices=sorted(SCHEMAS), default='qna')
+    plan.add_argument('-m', '--model', default='llama3')
+    prompt = plan.add_mutually_exclusive_group(required=True)
+    prompt.add_argument('-s', '--system-prompt')
+    prompt.add_argument('--system-prompt-file')
+    plan.add_argument('--prompt-columns', nargs='+')
+    plan.add_argument('--output-column')
+    plan.add_argument('--prompt-template')
+    plan.add_argument('-o', '--output', help="Merged dataset (default: the schema's output file).")
+    plan.add_argument('--shard-rows', type=int, default=DEFAULT_SHARD_ROWS,
+                      help=f"Rows per shard (default: {DEFAULT_SHARD_ROWS}).")
+
+    worker = commands.add_parser('work', help="Fill shards until none are left.")
+    worker.add_argument('--hosts', nargs='+', default=None, help="Ollama servers this worker uses.")
+    worker.add_argument('-c', '--concurrency', type=int, default=None,
+                        help=f"Requests in flight (default: {DEFAULT_CONCURRENCY} per host).")
+    worker.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    worker.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f"A shard goes back to the queue if its worker is silent this long "
+                             f"(default: {DEFAULT_LEASE_SECONDS}).")
+    worker.add_argument('--worker-id', help="Name shown in the queue (default: host:pid).")
+    worker.add_argument('--requests-per-sec', type=float, help="This worker's request rate limit.")
+    worker.add_argument('--tokens-per-min', type=float, help="This worker's token rate limit.")
+    worker.add_argument('--max-tokens', type=int,
+                        help="Hand the current shard back and exit once this worker has used this many tokens.")
+    worker.add_argument('--max-seconds', type=float,
+                        help="Hand the current shard back and exit after this many seconds.")
+    worker.add_argument('--no-cache', action='store_true')
+    worker.add_argument('--cache-path', default=DEFAULT_CACHE_PATH)
+
+    merger = commands.add_parser('merge', help="Write the finished shards out as one dataset.")
+    merger.add_argument('-o', '--output', help="Override the output chosen at plan time.")
+
+    commands.add_parser('status', help="Show shard counts and live leases.")
+
+    for command in (plan, worker, merger, commands.choices['status']):
+        command.add_argument('--queue', default='shards.sqlite3', help="Queue database (default: shards.sqlite3).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    queue = ShardQueue(args.queue)
+    try:
+        if args.command == 'plan':
+            if args.system_prompt_file:
+                with open(args.system_prompt_file, 'r', encoding='utf-8') as file:
+                    system_prompt = file.read().strip()
+            else:
+                system_prompt = args.system_prompt
+            config = {
+                'schema': args.schema,
+                'prompt_columns': args.prompt_columns,
+                'output_column': args.output_column,
+                'prompt_template': args.prompt_template,
+                'system_prompt': system_prompt,
+                'model': args.model,
+                'output': os.path.abspath(args.output or get_schema(args.schema).output_path),
+            }
+            count = queue.plan(args.inputs, config, args.shard_rows)
+            print(f"Planned {count} shards in '{args.queue}'. Start workers with: python shards.py work --queue {args.queue}")
+        elif args.command == 'work':
+            host_list = args.hosts or default_hosts()
+            concurrency = args.concurrency or DEFAULT_CONCURRENCY * len(host_list)
+            hosts = HostPool(host_list, pool_size=concurrency, timeout=args.timeout)
+            cache = None if args.no_cache else ResponseCache(args.cache_path)
+            limiter = RateLimiter(args.requests_per_sec, args.tokens_per_min)
+            budget = Budget(args.max_tokens, args.max_seconds) if args.max_tokens or args.max_seconds else None
+            try:
+                completed = work(queue, args.worker_id, args.lease_seconds, concurrency=concurrency,
+                                 client=hosts, cache=cache, limiter=limiter, budget=budget)
+            except KeyboardInterrupt:
+                print("Interrupted. The current shard was returned to the queue; its progress is kept.")
+                return 130
+            finally:
+                if cache is not None:
+                    cache.close()
+            if budget is not None and budget.exhausted():
+                print(f"Stopped early: {budget.summary()}. This worker completed {completed} shards; "
+                      f"its last shard is back in the queue with its progress kept.")
+                return 0
+            print(f"No shards left; this worker completed {completed}. Merge with: python shards.py merge --queue {args.queue}")
+        elif args.command == 'merge':
+            rows = merge(queue, args.output)
+            print(f"Merged {rows} rows into '{args.output or queue.config()['output']}'.")
+        else:
+            counts = queue.counts()
+            print(', '.join(f"{counts.get(state, 0)} {state}" for state in ('pending', 'leased', 'done')))
+            now = time.time()
+            for row in queue.shards():
+                if row[4] == 'leased':
+                    print(f"  shard {row[0]}: {row[5]}, attempt {row[6]}, lease "
+                          f"{'expired' if row[7] < now else f'{row[7] - now:.0f} s left'}")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
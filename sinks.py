@@ -0,0 +1,146 @@
+import os
+import time
+
+import pandas as pd
+
+DEFAULT_FLUSH_SECONDS = 5.0
+
+
+class Sink:
+    """Buffers finished batches and appends them to `path` once a row-count or age threshold is hit."""
+
+    default_max_rows = 100
+    # Sinks that write the row index keep it when several buffered frames are joined.
+    keep_index = False
+
+    def __init__(self, path, max_rows=None, max_seconds=DEFAULT_FLUSH_SECONDS):
+        self.path = path
+        self.max_rows = max_rows or self.default_max_rows
+        self.max_seconds = max_seconds
+        self.buffer = []
+        self.buffered_rows = 0
+        self.rows_written = 0
+        self.last_flush = time.monotonic()
+
+    def write_frame(self, frame):
+        self.buffer.append(frame)
+        self.buffered_rows += len(frame)
+        if self.buffered_rows >= self.max_rows or time.monotonic() - self.last_flush >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            frame = self.buffer[0] if len(self.buffer) == 1 else pd.concat(self.buffer, ignore_index=not self.keep_index)
+            self._write_frame(frame)
+            self.rows_written += len(frame)
+            self.buffer = []
+            self.buffered_rows = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def _write_frame(self, frame):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class CsvSink(Sink):
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+
+    def _write_frame(self, frame):
+        frame.to_csv(self.file, header=self.rows_written == 0, index=False)
+        self.file.flush()
+
+    def _close(self):
+        self.file.close()
+
+
+class JsonlSink(Sink):
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def _write_frame(self, frame):
+        text = frame.to_json(orient='records', lines=True)
+        self.file.write(text if text.endswith('\n') else text + '\n')
+        self.file.flush()
+
+    def _close(self):
+        self.file.close()
+
+
+class ParquetSink(Sink):
+    # Every flush becomes one row group, so flush in larger batches than the text formats.
+    default_max_rows = 10000
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.writer = None
+        self.schema = None
+
+    def _write_frame(self, frame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        if self.writer is None:
+            # A column with no values yet (e.g. a first batch of failed rows) is typed null and
+            # would reject later text, so fix those as strings.
+            self.schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                     for field in table.schema], metadata=table.schema.metadata)
+            table = table.cast(self.schema)
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table)
+
+    def _close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+SINKS = {
+    '.csv': CsvSink,
+    '.json': JsonlSink,
+    '.jsonl': JsonlSink,
+    '.parquet': ParquetSink,
+}
+
+
+def open_sink(path, **kwargs):
+    sink_class = SINKS.get(os.path.splitext(path)[1].lower())
+    if sink_class is None:
+        raise ValueError(f"Unsupported output format: {path}")
+    return sink_class(path, **kwargs)
+
+
+class OrderedWriter:
+    """Hands batches that finish out of order to a sink in row order, holding back only the gap.
+
+    Each frame is keyed by the index of its first row and covers `rows` input rows (by default
+    its length; more when rows were dropped from it).
+    """
+
+    def __init__(self, sink, start=0):
+        self.sink = sink
+        self.next_index = start
+        self.pending = {}
+
+    def add(self, start, frame, rows=None):
+        self.pending[start] = (frame, len(frame) if rows is None else rows)
+        while self.next_index in self.pending:
+            frame, rows = self.pending.pop(self.next_index)
+            if len(frame):
+                self.sink.write_frame(frame)
+            self.next_index += rows
+
+    def close(self):
+        # Batches behind a gap (e.g. a run stopped early) are still written, in order.
+        for start in sorted(self.pending):
+            frame, _ = self.pending.pop(start)
+            if len(frame):
+                self.sink.write_frame(frame)
+        self.sink.close()
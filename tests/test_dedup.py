@@ -0,0 +1,24 @@
+import pandas as pd
+
+from dedup import find_duplicates
+from row_source import RowSource
+from schemas import get_schema
+
+
+def exact_duplicates(tmp_path, prompts):
+    path = tmp_path / 'input.csv'
+    pd.DataFrame({'prompt': prompts}).to_csv(path, index=False)
+    return find_duplicates(RowSource(str(path)), get_schema('qna')).duplicate_of
+
+
+def test_prompts_differing_in_meaningful_punctuation_are_not_merged(tmp_path):
+    prompts = ['What is 2+2?', 'What is 2-2?', 'What is 2*2?', 'Explain C++', 'Explain C#',
+               'is x > y', 'is x < y']
+
+    assert exact_duplicates(tmp_path, prompts) == {}
+
+
+def test_case_unicode_whitespace_and_trailing_punctuation_are_merged(tmp_path):
+    prompts = ['What is 2+2?', 'what  is 2＋2', 'WHAT IS 2+2 ?!', 'Explain C++.']
+
+    assert exact_duplicates(tmp_path, prompts) == {1: 0, 2: 0}
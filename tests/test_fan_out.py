@@ -0,0 +1,39 @@
+import asyncio
+import itertools
+import time
+
+import pandas as pd
+
+from fan_out import FanOut
+from row_source import RowSource
+from schemas import get_schema
+
+
+class PerModelLatency:
+    """Answers after one of each model's delays in turn and records how late its event loop woke up."""
+
+    timeout = 300
+
+    def __init__(self, delays):
+        self.delays = {model: itertools.cycle(cycle) for model, cycle in delays.items()}
+        self.lag = dict.fromkeys(delays, 0.0)
+
+    async def async_chat(self, model, **kwargs):
+        delay = next(self.delays[model])
+        started = time.perf_counter()
+        await asyncio.sleep(delay)
+        self.lag[model] = max(self.lag[model], time.perf_counter() - started - delay)
+        return {'message': {'content': model}}
+
+
+def test_fast_model_waiting_for_the_reader_keeps_its_loop_running(tmp_path):
+    input_path = tmp_path / 'input.csv'
+    pd.DataFrame({'prompt': [f'q{i}' for i in range(30)]}).to_csv(input_path, index=False)
+    # The fast model's replies come back at different times, so it has one in flight while it waits for a batch.
+    client = PerModelLatency({'fast': (0.01, 0.03), 'slow': (0.2,)})
+    fan_out = FanOut(RowSource(str(input_path), batch_size=10), get_schema('qna'), 'system',
+                     [('fast', 2), ('slow', 2)], output_path=str(tmp_path / 'output.csv'), client=client,
+                     read_ahead=1)
+
+    assert fan_out.run() == {'fast': 30, 'slow': 30}
+    assert client.lag['fast'] < 0.1
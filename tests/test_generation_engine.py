@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import time
+
+import pandas as pd
+
+from generation_engine import Generator, RunControl
+from row_source import RowSource
+from schemas import get_schema
+
+
+class SlowLoadingClient:
+    """Takes `load_seconds` to preload the model, then answers every request at once."""
+
+    timeout = 300
+
+    def __init__(self, load_seconds):
+        self.load_seconds = load_seconds
+        self.requests = 0
+
+    async def preload(self, model, **kwargs):
+        await asyncio.sleep(self.load_seconds)
+        return {'host': {'load_duration': int(self.load_seconds * 1e9)}}
+
+    async def release(self, model, **kwargs):
+        pass
+
+    async def async_chat(self, **kwargs):
+        self.requests += 1
+        return {'message': {'content': 'answer'}}
+
+
+def test_cancel_during_warm_up_does_not_wait_for_the_model_to_load(tmp_path):
+    input_path = tmp_path / 'input.csv'
+    pd.DataFrame({'prompt': ['a', 'b']}).to_csv(input_path, index=False)
+    client = SlowLoadingClient(load_seconds=30)
+    generator = Generator(RowSource(str(input_path)), get_schema('qna'), 'system', 'model',
+                          output_path=str(tmp_path / 'output.csv'), client=client)
+    control = RunControl()
+    threading.Timer(0.2, control.cancel).start()
+
+    started = time.perf_counter()
+    assert generator.run(control=control) == 0
+    assert time.perf_counter() - started < 2
+    assert client.requests == 0
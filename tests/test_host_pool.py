@@ -0,0 +1,18 @@
+from host_pool import HostPool
+
+
+def test_overloaded_host_is_passed_over_without_counting_as_a_success():
+    pool = HostPool(['http://127.0.0.1:1', 'http://127.0.0.1:2'])
+    busy, other = pool.hosts
+    for state in pool.hosts:
+        state.in_flight += 1
+        pool._release(state, 0.1)
+
+    assert pool._acquire([]) is busy
+    pool._release(busy, overloaded=True)
+
+    assert busy.requests == 1 and busy.ewma_seconds == 0.1
+    assert busy.overloads == 1 and busy.down_until == 0.0
+    assert pool._acquire([]) is other
+    # With the other host already tried, the busy one is still used rather than none at all.
+    assert pool._acquire([other]) is busy
@@ -0,0 +1,15 @@
+from journal import Journal
+
+
+def test_rows_are_readable_before_the_background_sync_and_restored_on_resume(tmp_path):
+    path = tmp_path / 'out.csv.journal.jsonl'
+    journal = Journal(str(path), sync_seconds=60)
+    journal.append(0, 'first')
+    journal.append(1, 'second')
+    # Flushed but not yet fsynced: a crash of the process alone would keep both rows.
+    assert len(path.read_text(encoding='utf-8').splitlines()) == 2
+    journal.close()
+
+    resumed = Journal(str(path), resume=True)
+    assert resumed.completed == {0: 'first', 1: 'second'}
+    resumed.close()
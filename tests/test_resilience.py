@@ -0,0 +1,39 @@
+import asyncio
+
+import ollama
+import pandas as pd
+
+from generation_engine import Generator
+from resilience import CircuitBreaker, RetryPolicy
+from row_source import RowSource
+from schemas import get_schema
+
+
+class ScriptedClient:
+    """Raises the scripted errors in order, then answers every request."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def async_chat(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'message': {'content': 'answer'}}
+
+
+def test_overloaded_probe_does_not_deadlock_the_breaker(tmp_path):
+    input_path = tmp_path / 'input.csv'
+    pd.DataFrame({'prompt': ['a', 'b', 'c']}).to_csv(input_path, index=False)
+    client = ScriptedClient([ConnectionError('refused')] * 5 + [ollama.ResponseError('busy', 503)])
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=0.1)
+    generator = Generator(RowSource(str(input_path)), get_schema('qna'), 'system', 'model',
+                          output_path=str(tmp_path / 'output.csv'), concurrency=1, client=client,
+                          retry=RetryPolicy(attempts=10, base_delay=0.01), breaker=breaker)
+
+    completed = asyncio.run(asyncio.wait_for(generator.arun(), 10))
+
+    assert completed == 3
+    assert client.calls == 9
+    assert not breaker.probing and not breaker.is_open
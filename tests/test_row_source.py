@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from row_source import RowSource
+
+
+@pytest.mark.parametrize('text', [
+    'a,b\n1,2\n3,4\n',
+    'a,b\n1,2\n3,4',
+    'a,b\r\n1,2\r\n',
+    'a,b\n\n1,2\n',
+    'a,b\n1,2\n\n',
+    'a,b\n',
+    'a,b',
+    # A quoted newline is part of its field, not a new row.
+    'a,b\n"x\ny",2\n3,4\n',
+    'a,b\n"x\ny",2\n\n3,4\n',
+])
+def test_csv_row_count_matches_the_rows_read(tmp_path, text):
+    path = tmp_path / 'input.csv'
+    path.write_text(text, encoding='utf-8', newline='')
+    source = RowSource(str(path))
+
+    assert len(source) == sum(len(batch) for batch in source.iter_batches())
+
+
+@pytest.mark.parametrize('text', ['prompt\na\n\nb\nc\n', 'prompt\n"a\nz"\n\nb\nc\n'])
+def test_csv_row_indices_do_not_depend_on_start(tmp_path, text):
+    path = tmp_path / 'input.csv'
+    path.write_text(text, encoding='utf-8', newline='')
+    source = RowSource(str(path), batch_size=2)
+    rows = pd.concat(source.iter_batches())['prompt']
+
+    for start in range(len(source)):
+        assert pd.concat(source.iter_batches(start))['prompt'].equals(rows[start:])
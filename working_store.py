@@ -0,0 +1,177 @@
+import os
+
+import pandas as pd
+
+from row_source import DEFAULT_BATCH_SIZE, RowSource
+from sinks import Sink, open_sink
+
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+MERGE_ROWS = 10000
+
+
+def working_store_path(input_path):
+    return f'{input_path}.arrow'
+
+
+def column_store_path(output_path):
+    return f'{output_path}.columns.arrow'
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return {b'source_size': str(stat.st_size).encode(), b'source_mtime_ns': str(stat.st_mtime_ns).encode()}
+
+
+def _is_current(store_path, input_path):
+    import pyarrow as pa
+    if not os.path.exists(store_path):
+        return False
+    try:
+        with pa.memory_map(store_path) as file:
+            metadata = pa.ipc.open_file(file).schema.metadata or {}
+    except pa.ArrowInvalid:
+        # A conversion that crashed half way leaves no footer behind.
+        return False
+    stamp = _stamp(input_path)
+    return all(metadata.get(key) == value for key, value in stamp.items())
+
+
+def convert_to_arrow(input_path, store_path, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream `input_path` into an uncompressed Arrow IPC file one batch at a time."""
+    import pyarrow as pa
+    source = RowSource(input_path, batch_size=batch_size)
+    temporary = f'{store_path}.tmp'
+    writer = None
+    try:
+        if source.format == 'parquet':
+            parquet_file = source._parquet_file()
+            schema = parquet_file.schema_arrow
+            batches = parquet_file.iter_batches(batch_size=batch_size)
+        else:
+            schema = None
+            batches = (pa.RecordBatch.from_pandas(frame, preserve_index=False) for frame in source.iter_batches())
+        for batch in batches:
+            if writer is None:
+                schema = (schema or batch.schema).with_metadata(_stamp(input_path))
+                writer = pa.ipc.new_file(temporary, schema)
+            writer.write_batch(batch.cast(schema) if batch.schema != schema else batch)
+        if writer is None:
+            schema = pa.schema([(column, pa.string()) for column in source.columns], metadata=_stamp(input_path))
+            writer = pa.ipc.new_file(temporary, schema)
+        writer.close()
+        writer = None
+        os.replace(temporary, store_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def open_working_store(input_path, store_path=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Memory-map `input_path` as an Arrow IPC file, converting it first unless it already is one
+    or an up-to-date conversion exists next to it."""
+    if os.path.splitext(input_path)[1].lower() in ARROW_EXTENSIONS:
+        return WorkingStore(input_path, batch_size)
+    store_path = store_path or working_store_path(input_path)
+    if not _is_current(store_path, input_path):
+        print(f"Converting '{input_path}' to the working store '{store_path}'...")
+        convert_to_arrow(input_path, store_path, batch_size)
+    return WorkingStore(store_path, batch_size)
+
+
+class WorkingStore:
+    """A dataset memory-mapped from an Arrow IPC file, with the same reading interface as RowSource.
+
+    Batches are zero-copy slices of the mapping, so only the rows being converted to pandas
+    take up memory and the OS pages the rest in and out. Outputs go to a separate ColumnStore
+    that holds nothing but row index and answer.
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        import pyarrow as pa
+        self.path = path
+        self.batch_size = batch_size
+        self.table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @property
+    def columns(self):
+        return list(self.table.column_names)
+
+    def iter_batches(self, start=0, stop=None, batch_size=None, columns=None):
+        """Yield DataFrames covering rows [start, stop), indexed by absolute row number."""
+        batch_size = batch_size or self.batch_size
+        stop = len(self) if stop is None else min(stop, len(self))
+        table = self.table if columns is None else self.table.select(list(columns))
+        for offset in range(start, stop, batch_size):
+            batch = table.slice(offset, min(batch_size, stop - offset)).to_pandas()
+            batch.index = pd.RangeIndex(offset, offset + len(batch))
+            yield batch
+
+    def read(self, start=0, stop=None):
+        """Materialise rows [start, stop) as a single DataFrame."""
+        batches = list(self.iter_batches(start, stop))
+        if not batches:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(batches)
+
+    def column_store(self, output_path, output_column):
+        return ColumnStore(self, output_path, output_column)
+
+
+class ColumnStore(Sink):
+    """Sink for the answer column alone: (row index, output) pairs appended to an Arrow IPC file.
+
+    Closing it joins the answers back onto their rows from the memory-mapped working store,
+    a slice at a time, and writes the result to `output_path` in that file's own format.
+    """
+
+    default_max_rows = 1000
+    keep_index = True
+
+    def __init__(self, store, output_path, output_column, **kwargs):
+        super().__init__(column_store_path(output_path), **kwargs)
+        import pyarrow as pa
+        self.store = store
+        self.output_path = output_path
+        self.output_column = output_column
+        self.schema = pa.schema([('index', pa.int64()), (output_column, pa.string())])
+        self.writer = pa.ipc.new_file(self.path, self.schema)
+
+    def _write_frame(self, frame):
+        import pyarrow as pa
+        self.writer.write_batch(pa.record_batch([
+            pa.array(frame.index.to_numpy(), type=pa.int64()),
+            pa.array(frame[self.output_column].tolist(), type=pa.string()),
+        ], schema=self.schema))
+
+    def _close(self):
+        import pyarrow as pa
+        self.writer.close()
+        with pa.memory_map(self.path) as file:
+            answers = pa.ipc.open_file(file).read_all()
+            self.merge(answers)
+        os.remove(self.path)
+
+    def merge(self, answers):
+        sink = open_sink(self.output_path)
+        try:
+            for offset in range(0, answers.num_rows, MERGE_ROWS):
+                chunk = answers.slice(offset, MERGE_ROWS)
+                indices = chunk.column('index').to_numpy()
+                # Answers arrive in row order, so a zero-copy slice covers the chunk and taking
+                # from it only touches those pages rather than concatenating the whole table.
+                first = int(indices[0])
+                rows = self.store.table.slice(first, int(indices[-1]) + 1 - first).take(indices - first)
+                output = chunk.column(self.output_column)
+                if self.output_column in rows.column_names:
+                    position = rows.column_names.index(self.output_column)
+                    rows = rows.set_column(position, self.output_column, output)
+                else:
+                    rows = rows.append_column(self.output_column, output)
+                sink.write_frame(rows.to_pandas())
+        finally:
+            sink.close()